@@ -0,0 +1,192 @@
+
+##
+# Batched NumPy evaluation of whole tree layers
+##
+import itertools
+
+import chess
+import numpy as np
+
+
+# piece-square tables from the "simplified evaluation function", written from white's side with rank 8 on top
+PAWN_TABLE = [
+    0,   0,   0,   0,   0,   0,   0,   0,
+    50,  50,  50,  50,  50,  50,  50,  50,
+    10,  10,  20,  30,  30,  20,  10,  10,
+    5,   5,   10,  25,  25,  10,  5,   5,
+    0,   0,   0,   20,  20,  0,   0,   0,
+    5,   -5,  -10, 0,   0,   -10, -5,  5,
+    5,   10,  10,  -20, -20, 10,  10,  5,
+    0,   0,   0,   0,   0,   0,   0,   0,
+]
+KNIGHT_TABLE = [
+    -50, -40, -30, -30, -30, -30, -40, -50,
+    -40, -20, 0,   0,   0,   0,   -20, -40,
+    -30, 0,   10,  15,  15,  10,  0,   -30,
+    -30, 5,   15,  20,  20,  15,  5,   -30,
+    -30, 0,   15,  20,  20,  15,  0,   -30,
+    -30, 5,   10,  15,  15,  10,  5,   -30,
+    -40, -20, 0,   5,   5,   0,   -20, -40,
+    -50, -40, -30, -30, -30, -30, -40, -50,
+]
+BISHOP_TABLE = [
+    -20, -10, -10, -10, -10, -10, -10, -20,
+    -10, 0,   0,   0,   0,   0,   0,   -10,
+    -10, 0,   5,   10,  10,  5,   0,   -10,
+    -10, 5,   5,   10,  10,  5,   5,   -10,
+    -10, 0,   10,  10,  10,  10,  0,   -10,
+    -10, 10,  10,  10,  10,  10,  10,  -10,
+    -10, 5,   0,   0,   0,   0,   5,   -10,
+    -20, -10, -10, -10, -10, -10, -10, -20,
+]
+ROOK_TABLE = [
+    0,   0,   0,   0,   0,   0,   0,   0,
+    5,   10,  10,  10,  10,  10,  10,  5,
+    -5,  0,   0,   0,   0,   0,   0,   -5,
+    -5,  0,   0,   0,   0,   0,   0,   -5,
+    -5,  0,   0,   0,   0,   0,   0,   -5,
+    -5,  0,   0,   0,   0,   0,   0,   -5,
+    -5,  0,   0,   0,   0,   0,   0,   -5,
+    0,   0,   0,   5,   5,   0,   0,   0,
+]
+QUEEN_TABLE = [
+    -20, -10, -10, -5,  -5,  -10, -10, -20,
+    -10, 0,   0,   0,   0,   0,   0,   -10,
+    -10, 0,   5,   5,   5,   5,   0,   -10,
+    -5,  0,   5,   5,   5,   5,   0,   -5,
+    0,   0,   5,   5,   5,   5,   0,   -5,
+    -10, 5,   5,   5,   5,   5,   0,   -10,
+    -10, 0,   5,   0,   0,   0,   0,   -10,
+    -20, -10, -10, -5,  -5,  -10, -10, -20,
+]
+KING_TABLE = [
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -20, -30, -30, -40, -40, -30, -30, -20,
+    -10, -20, -20, -20, -20, -20, -20, -10,
+    20,  20,  0,   0,   0,   0,   20,  20,
+    20,  30,  10,  0,   0,   10,  30,  20,
+]
+# ordered like chess piece types: pawn, knight, bishop, rook, queen, king
+PIECE_SQUARE_TABLES = [PAWN_TABLE, KNIGHT_TABLE, BISHOP_TABLE, ROOK_TABLE, QUEEN_TABLE, KING_TABLE]
+
+
+def pack_boards(boards: list):
+    """
+    packs the piece bitboards of many boards into one array
+    :param boards: list of chess.Board
+    :return: (n, 8) uint64 array of pawns, knights, bishops, rooks, queens, kings, white and black occupancy
+    """
+    values = itertools.chain.from_iterable((b.pawns, b.knights, b.bishops, b.rooks, b.queens, b.kings,
+                                            b.occupied_co[chess.WHITE], b.occupied_co[chess.BLACK]) for b in boards)
+    return np.fromiter(values, dtype="<u8", count=8 * len(boards)).reshape(len(boards), 8)
+
+
+def sequential_sums(values: np.ndarray, offsets: np.ndarray, counts: np.ndarray):
+    """
+    sums consecutive runs of values, adding them left to right like a python loop would so that averages come out
+    bit for bit the same as BoardNode.score_to_average_of_children
+    :param values: values of all runs, one after the other
+    :param offsets: index of the first value of each run
+    :param counts: length of each run
+    :return: sum of each run
+    """
+    rows = np.repeat(np.arange(len(counts)), counts)
+    cols = np.arange(len(values)) - np.repeat(offsets, counts)
+    padded = np.zeros((len(counts), counts.max()), dtype=values.dtype)
+    padded[rows, cols] = values
+    sums = np.zeros(len(counts), dtype=values.dtype)
+    for col in range(padded.shape[1]):
+        sums += padded[:, col]
+    return sums
+
+
+class BatchEvaluator:
+    """
+    Scores a whole layer of boards at once. Without piece-square tables the scores are exactly the ones from
+    score_chessboard for the same weights.
+    """
+
+    def __init__(self, k_val=9000, q_val=1000, r_val=550, b_val=350, n_val=350, p_val=100,
+                 piece_square_tables=None):
+        """
+        :param piece_square_tables: optional list of six 64 entry tables (pawn to king, rank 8 first, white's side),
+        for example PIECE_SQUARE_TABLES
+        """
+        values = np.array([p_val, n_val, b_val, r_val, q_val, k_val], dtype=np.int64)
+        white_table = np.repeat(values[:, None], 64, axis=1)  # (6 piece types, 64 squares)
+        black_table = white_table.copy()
+        if piece_square_tables is not None:
+            # flip the rows so the tables are indexed by chess square (a1 = 0), black reads them mirrored
+            tables = np.array(piece_square_tables, dtype=np.int64).reshape(6, 8, 8)
+            white_table += tables[:, ::-1, :].reshape(6, 64)
+            black_table += tables.reshape(6, 64)
+        square_values = np.concatenate((white_table, -black_table)).reshape(12, 8, 8)  # (plane, rank, file)
+
+        # look-up table of the summed square values for every possible byte (one rank) of every piece plane
+        bits = (np.arange(256)[:, None] >> np.arange(8)) & 1  # (byte value, file)
+        self.rank_table = np.einsum("vf,prf->prv", bits, square_values).ravel()  # (plane, rank, byte value)
+        self.rank_offsets = (256 * np.arange(96)).reshape(12, 8)
+
+    def score_boards(self, boards: list):
+        """
+        :param boards: list of chess.Board
+        :return: int64 array of scores from white's point of view
+        """
+        if len(boards) == 0:
+            return np.zeros(0, dtype=np.int64)
+        return self.score_packed(pack_boards(boards))
+
+    def score_packed(self, packed: np.ndarray):
+        """
+        :param packed: (n, 8) uint64 array from pack_boards
+        :return: int64 array of scores from white's point of view
+        """
+        n = packed.shape[0]
+        masks = np.empty((n, 12), dtype="<u8")
+        masks[:, :6] = packed[:, :6] & packed[:, 6:7]  # white pieces
+        masks[:, 6:] = packed[:, :6] & packed[:, 7:8]  # black pieces
+        ranks = masks.view(np.uint8).reshape(n, 12, 8)
+        return np.take(self.rank_table, ranks + self.rank_offsets).sum(axis=(1, 2))
+
+    def score_layers(self, layer_nodes: list, scoring_style: str, root_is_white=True):
+        """
+        scores every layer of a BoardTree from the bottom up. Leaves of each layer are evaluated in one batch and the
+        interior nodes are reduced from the scores of their children, which sit next to each other in the layer below
+        :param layer_nodes: BoardTree.layer_nodes
+        :param scoring_style: "average" or "minimax"
+        :param root_is_white: True if white moves at the root
+        :return:
+        """
+        if scoring_style not in ("average", "minimax"):
+            raise Exception("Invalid scoring style: " + scoring_style)
+
+        dtype = np.float64 if scoring_style == "average" else np.int64
+        child_scores = np.zeros(0, dtype=dtype)
+        depth = len(layer_nodes) - 1
+        while depth != 0:
+            layer = layer_nodes[depth]
+            counts = np.fromiter((len(node.children) for node in layer), dtype=np.int64, count=len(layer))
+            scores = np.zeros(len(layer), dtype=dtype)
+
+            is_leaf = counts == 0
+            leaf_idx = np.flatnonzero(is_leaf)
+            if len(leaf_idx) > 0:
+                scores[leaf_idx] = self.score_boards([layer[i].board for i in leaf_idx])
+
+            parent_idx = np.flatnonzero(~is_leaf)
+            if len(parent_idx) > 0:
+                offsets = np.concatenate(([0], np.cumsum(counts[parent_idx])[:-1]))
+                if scoring_style == "average":
+                    scores[parent_idx] = sequential_sums(child_scores, offsets, counts[parent_idx]) / counts[parent_idx]
+                elif root_is_white == (depth % 2 == 0):  # white to move picks the highest child
+                    scores[parent_idx] = np.maximum.reduceat(child_scores, offsets)
+                else:
+                    scores[parent_idx] = np.minimum.reduceat(child_scores, offsets)
+
+            for node, score in zip(layer, scores.tolist()):
+                node.set_score(score)
+            child_scores = scores
+            depth -= 1
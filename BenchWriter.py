@@ -0,0 +1,68 @@
+
+##
+# Streaming bench results
+##
+import csv
+import os
+
+
+class BenchResultWriter:
+    """
+    Appends bench results to a csv file one row at a time, flushing every row to disk so a crash only loses the game
+    that was being played. An existing file can be resumed: rows already in it are kept and completed_games tells
+    which games can be skipped.
+    """
+
+    def __init__(self, path: str, columns: list, resume=True):
+        """
+        :param path: csv file to write to
+        :param columns: column names, the first column is the game number
+        :param resume: True to keep the rows of an existing file, False to start the file over
+        """
+        self.path = path
+        self.columns = list(columns)
+
+        if resume and os.path.exists(self.path):
+            self.repair()
+        if not resume or not os.path.exists(self.path) or os.path.getsize(self.path) == 0:
+            with open(self.path, "w", newline="") as file:
+                csv.writer(file).writerow(self.columns)
+        else:
+            with open(self.path, newline="") as file:
+                header = next(csv.reader(file), None)
+            if header != self.columns:
+                raise Exception("Results file " + self.path + " has different columns: " + str(header))
+
+    def repair(self):
+        """
+        cuts off a half written last line left behind by a crash
+        :return:
+        """
+        with open(self.path, "rb+") as file:
+            data = file.read()
+            if len(data) > 0 and not data.endswith(b"\n"):
+                file.truncate(data.rfind(b"\n") + 1)
+
+    def write_row(self, row: list):
+        """
+        appends one finished game and makes sure it reached the disk
+        :param row: values in column order
+        :return:
+        """
+        with open(self.path, "a", newline="") as file:
+            csv.writer(file).writerow(row)
+            file.flush()
+            os.fsync(file.fileno())
+
+    def read_rows(self):
+        """
+        :return: list of rows as dicts of column name to string value
+        """
+        with open(self.path, newline="") as file:
+            return list(csv.DictReader(file))
+
+    def completed_games(self):
+        """
+        :return: set of the game numbers already in the file
+        """
+        return set(int(row[self.columns[0]]) for row in self.read_rows())
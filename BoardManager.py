@@ -1,10 +1,84 @@
 import chess
-import pandas as pd
+import os
+import random
 import time
-import xlwt
 
+from BenchWriter import BenchResultWriter
 from ChessThinker import ChessThinker
+from OpeningBook import BookBuilder
 from Opponents import FishPlayer, RandomPlayer
+from SearchStats import STATS_COLUMNS
+from Tournament import Tournament
+
+
+# pandas, xlwt and the process pool are imported where they are used, a single game or a bench worker process
+# never loads them
+BENCH_COLUMNS = ["Game", "Turns to finish", "runtime", "depth", "outcome"]
+PONDER_COLUMNS = ["ponder hits", "ponder hit rate"]
+CACHE_COLUMNS = ["cache hits", "cache hit rate"]
+
+
+def bench_columns(instrument: bool, ponder=False, cache=False):
+    """
+    :param instrument: True if the thinker records search stats
+    :param ponder: True if the thinker ponders
+    :param cache: True if the thinker uses an evaluation cache
+    :return: columns of a bench row, with the search stats columns appended when instrumenting, the ponder columns
+    after them when pondering and the cache columns last when using a cache
+    """
+    columns = list(BENCH_COLUMNS)
+    if instrument:
+        columns += STATS_COLUMNS
+    if ponder:
+        columns += PONDER_COLUMNS
+    if cache:
+        columns += CACHE_COLUMNS
+    return columns
+
+
+def play_seeded_game(opponent_type: str, game_num: int, seed: int, thinker_options: dict):
+    """
+    plays one bench game on a fresh BoardManager, used as a worker task by parallel_bench_test
+    :param opponent_type: "random" or "stockfish"
+    :param game_num: number of the game in the bench run
+    :param seed: seed for the random tie-breaks and random opponent moves of this game
+    :param thinker_options: keyword arguments for ChessThinker.configure
+    :return: bench row of [game, turns, runtime, depth, outcome] followed by the search, ponder and cache stats
+    the thinker keeps
+    """
+    random.seed(seed)
+    manager = BoardManager(opponent_type)
+    manager.chess_thinker.configure(**thinker_options)
+    outcome, turns, elapsed, depth = manager.play_game(show_board=False)
+    row = [game_num, turns, elapsed, depth, outcome] + manager.stats_row()
+    manager.close()
+    return row
+
+
+def generate_self_play_book(path: str, games: int, depth=2, max_plies=16, seed=0, thinker_options=None):
+    """
+    plays the openings of games where the thinker plays both sides and writes the moves it chose as a Polyglot book.
+    The random tie-breaks between equally scored moves give the book its variety
+    :param path: .bin file to write
+    :param games: number of games to play
+    :param depth: search depth of the thinker
+    :param max_plies: plies of every game to play and keep
+    :param seed: seed for the random tie-breaks
+    :param thinker_options: extra keyword arguments for ChessThinker.configure
+    :return: number of book entries written
+    """
+    random.seed(seed)
+    builder = BookBuilder(max_plies=max_plies)
+    for _ in range(games):
+        board = chess.Board()
+        thinker = ChessThinker(board)
+        thinker.configure(**(thinker_options if thinker_options is not None else dict()))
+        thinker.set_depth(depth)
+        while len(board.move_stack) < max_plies and not board.is_game_over():
+            board.push_uci(thinker.generate_move())
+        thinker.close()
+        builder.add_game(board.move_stack)
+    return builder.write(path)
 
 
 class BoardManager:
@@ -35,12 +109,22 @@ class BoardManager:
         :return:
         """
         self.chessboard.set_fen("rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1")  # set the chess.Board
-        if self.opponent_type == " stockfish":
+        if self.opponent_type == "stockfish":
             self.opponent.reset_board()
 
+    def close(self):
+        """
+        stops the thinker's worker processes and hands the opponent's engine back to its pool
+        :return:
+        """
+        self.chess_thinker.close()
+        if self.opponent_type == "stockfish":
+            self.opponent.close()
+
     def play_game(self, show_board: bool):
         # reset the board to the start position
         self.reset_board()  # reset the board before playing
+        self.chess_thinker.clear_move_stats()
 
         is_white_player_turn = True
 
@@ -68,6 +152,7 @@ class BoardManager:
                     self.opponent.figure_move()
                 turn_count += 1
                 is_white_player_turn = not is_white_player_turn
+        self.chess_thinker.stop_pondering()
         elapsed = round(time.time() - start, 2)
         print(self.chessboard, "\n")
         outcome = self.chessboard.outcome()
@@ -89,21 +174,208 @@ class BoardManager:
         print("Stalemates:", str(self.stalemates), "\n\n\n")
         return outcome_string, turn_count, elapsed, self.chess_thinker.get_depth()
 
+    def count_outcomes(self, outcomes: list):
+        """
+        sets the win counters from a list of outcome strings returned by play_game
+        :param outcomes: list of outcome strings
+        :return:
+        """
+        self.thinker_wins = sum(1 for outcome in outcomes if outcome == "Thinker Win")
+        self.opponent_wins = sum(1 for outcome in outcomes if outcome == "Opponent Win")
+        self.stalemates = len(outcomes) - self.thinker_wins - self.opponent_wins
+
+    def stats_row(self):
+        """
+        :return: search stats of the thinker summed over the last game when the thinker is instrumented, followed by
+        its ponder hits and hit rate when it ponders and its cache hits and hit rate when it uses a cache
+        """
+        row = list()
+        if self.chess_thinker.instrument:
+            row += self.chess_thinker.get_game_stats().to_row()
+        if self.chess_thinker.ponder:
+            ponder_stats = self.chess_thinker.get_ponder_stats()
+            row += [ponder_stats["ponder_hits"], ponder_stats["ponder_hit_rate"]]
+        if self.chess_thinker.eval_cache is not None:
+            cache_stats = self.chess_thinker.get_cache_stats()
+            row += [cache_stats["cache_hits"], cache_stats["cache_hit_rate"]]
+        return row
+
     def thinker_move(self):
         move = self.chess_thinker.generate_move()  # generate a move to make from the chess_thinker
         self.opponent.move(move)  # apply the move to the opponent's board
+        self.chess_thinker.start_pondering()  # think on the opponent's time
 
-    def random_bench_test(self, filepath: str, games_to_play: int, depth: int, show_board=False):
-
+    def random_bench_test(self, filepath: str, games_to_play: int, depth: int, show_board=False,
+                          results_path=None, resume=False):
+        """
+        plays bench games one after another, every finished game is written to a csv file straight away and the
+        excel workbook is made from that file at the end
+        :param filepath: filepath to save the excel document to
+        :param games_to_play: number of games to play
+        :param depth: search depth of the thinker
+        :param show_board: print the board after every move
+        :param results_path: csv file the games are streamed to, defaults to filepath with a .csv extension
+        :param resume: True to keep the games already in the csv file and only play the missing ones
+        :return: pd.DataFrame with one row per game
+        """
         self.chess_thinker.set_depth(depth)
+        writer = self.open_results(filepath, results_path, resume, self.chess_thinker.instrument,
+                                   self.chess_thinker.ponder, self.chess_thinker.eval_cache is not None)
+        completed = writer.completed_games()
 
-        df = pd.DataFrame(columns=["Game", "Turns to finish", "runtime", "depth", "outcome"])
         start = time.time()
         for game_num in range(1, games_to_play + 1):
+            if game_num in completed:
+                continue
             outcome, turns, elapsed, depth = self.play_game(show_board=show_board)
-            df.loc[len(df.index)] = [game_num, turns, elapsed, depth, outcome]
-        total_elapsed = time.time() - start
+            writer.write_row([game_num, turns, elapsed, depth, outcome] + self.stats_row())
+        return self.summarize_results(filepath, writer, time.time() - start, completed)
+
+    def parallel_bench_test(self, filepath: str, games_to_play: int, depth: int, workers=None, seed=0,
+                            thinker_options=None, results_path=None, resume=False):
+        """
+        plays the bench games concurrently, every game runs in a worker process on its own BoardManager and is
+        written to a csv file as soon as it finishes
+        :param filepath: filepath to save the excel document to
+        :param games_to_play: number of games to play
+        :param depth: search depth of the thinker
+        :param workers: number of worker processes, None for one per cpu
+        :param seed: base seed, game n is played with seed + n so runs can be reproduced
+        :param thinker_options: extra keyword arguments for ChessThinker.configure
+        :param results_path: csv file the games are streamed to, defaults to filepath with a .csv extension
+        :param resume: True to keep the games already in the csv file and only play the missing ones
+        :return: pd.DataFrame with one row per game
+        """
+        from concurrent.futures import ProcessPoolExecutor, as_completed
+        options = dict(thinker_options) if thinker_options is not None else dict()
+        options["depth"] = depth
+        writer = self.open_results(filepath, results_path, resume, bool(options.get("instrument")),
+                                   bool(options.get("ponder")), options.get("cache") is not None)
+        completed = writer.completed_games()
+
+        start = time.time()
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(play_seeded_game, self.opponent_type, game_num, seed + game_num, options)
+                       for game_num in range(1, games_to_play + 1) if game_num not in completed]
+            for future in as_completed(futures):
+                writer.write_row(future.result())
+        return self.summarize_results(filepath, writer, time.time() - start, completed)
+
+    def tournament_test(self, max_games: int, thinker_options: dict, opponent=None, workers=None, seed=0, elo0=0.0,
+                        elo1=10.0, alpha=0.05, beta=0.05, results_path=None, resume=False):
+        """
+        plays a match with alternating colours in worker processes until a sequential probability ratio test decides
+        whether the thinker is elo1 rather than elo0 points stronger than its opponent, or max_games are played
+        :param max_games: most games to play
+        :param thinker_options: keyword arguments for ChessThinker.configure of the thinker being measured
+        :param opponent: keyword arguments for ChessThinker.configure of a second thinker for a thinker-vs-thinker
+        match, None to play this manager's opponent
+        :param workers: number of games played at once, None for one per cpu
+        :param seed: base seed, game n is played with seed + n so runs can be reproduced
+        :param elo0: elo difference of the null hypothesis
+        :param elo1: elo difference of the alternative hypothesis
+        :param alpha: chance of accepting elo1 when elo0 is true
+        :param beta: chance of accepting elo0 when elo1 is true
+        :param results_path: optional csv file the games and the running estimate are streamed to
+        :param resume: True to count the games already in the csv file and only play the missing ones
+        :return: dict with the game counts, elo estimate, llr and decision, see Tournament.get_stats
+        """
+        tournament = Tournament(thinker_options, opponent if opponent is not None else self.opponent_type,
+                                workers=workers, seed=seed, elo0=elo0, elo1=elo1, alpha=alpha, beta=beta)
+        stats = tournament.run(max_games, results_path=results_path, resume=resume)
+        self.thinker_wins = stats["wins"]
+        self.opponent_wins = stats["losses"]
+        self.stalemates = stats["draws"]
+        return stats
 
+    def generate_dataset(self, directory: str, games: int, thinker_options=None, opponent=None, workers=None, seed=0,
+                         score_depth=None, shard_size=None):
+        """
+        plays games in worker processes and streams every position of them into memory mapped .npy shards, see
+        PositionDataset. Read them back with PositionDataset(directory) to fit the piece values
+        :param directory: directory of the shards, new shards are added after the ones already in it
+        :param games: number of games to play
+        :param thinker_options: keyword arguments for ChessThinker.configure of one side, or "random" or "stockfish"
+        :param opponent: spec of the other side like thinker_options, None to play this manager's opponent
+        :param workers: number of worker processes, None for one per cpu
+        :param seed: base seed, game n is played with seed + n so runs can be reproduced
+        :param score_depth: depth of the alpha-beta search scoring every position, defaults to DEFAULT_SCORE_DEPTH
+        :param shard_size: records per shard, defaults to DEFAULT_SHARD_SIZE
+        :return: number of positions written
+        """
+        from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+        from PositionDataset import DEFAULT_SCORE_DEPTH, DEFAULT_SHARD_SIZE, ShardWriter, play_dataset_game
+        player = thinker_options if thinker_options is not None else dict()
+        opponent = opponent if opponent is not None else self.opponent_type
+        score_depth = score_depth if score_depth is not None else DEFAULT_SCORE_DEPTH
+        workers = workers if workers is not None else os.cpu_count() or 1
+
+        start = time.time()
+        pending = iter(range(1, games + 1))
+        with ShardWriter(directory, shard_size if shard_size is not None else DEFAULT_SHARD_SIZE) as writer, \
+                ProcessPoolExecutor(max_workers=workers) as pool:
+            running = set()
+            # a couple of games per worker in flight, the positions of finished games are written out straight away
+            for game_num in pending:
+                running.add(pool.submit(play_dataset_game, player, opponent, game_num, seed + game_num, score_depth))
+                if len(running) >= 2 * workers:
+                    break
+            while len(running) > 0:
+                done, running = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    writer.write(future.result())
+                    writer.flush()
+                    game_num = next(pending, None)
+                    if game_num is not None:
+                        running.add(pool.submit(play_dataset_game, player, opponent, game_num, seed + game_num,
+                                                score_depth))
+        print("Wrote", writer.records_written, "positions of", games, "games in", round(time.time() - start, 2),
+              "seconds")
+        return writer.records_written
+
+    def open_results(self, filepath: str, results_path=None, resume=False, instrument=False, ponder=False,
+                     cache=False):
+        """
+        :param filepath: filepath of the excel document
+        :param results_path: csv file for the streamed games, defaults to filepath with a .csv extension
+        :param resume: True to keep the games already in the csv file
+        :param instrument: True to add the search stats columns
+        :param ponder: True to add the ponder columns
+        :param cache: True to add the cache columns
+        :return: BenchResultWriter
+        """
+        if results_path is None:
+            results_path = os.path.splitext(filepath)[0] + ".csv"
+        return BenchResultWriter(results_path, bench_columns(instrument, ponder, cache), resume=resume)
+
+    def summarize_results(self, filepath: str, writer: BenchResultWriter, session_elapsed: float, resumed_games: set):
+        """
+        reads the streamed games back, sets the win counters from them and saves the excel workbook
+        :param filepath: filepath to save the excel document to
+        :param writer: writer the games were streamed to
+        :param session_elapsed: runtime of the games played in this session
+        :param resumed_games: game numbers that were already in the file before this session
+        :return: pd.DataFrame with one row per game, sorted by game number
+        """
+        import pandas as pd
+        df = pd.read_csv(writer.path).sort_values(BENCH_COLUMNS[0]).reset_index(drop=True)
+        self.count_outcomes(df["outcome"].to_list())
+        # games resumed from an earlier session count with their own runtime
+        total_elapsed = session_elapsed + df.loc[df[BENCH_COLUMNS[0]].isin(resumed_games), "runtime"].sum()
+        self.save_bench_workbook(filepath, df, total_elapsed)
+        return df
+
+    def save_bench_workbook(self, filepath: str, df: "pd.DataFrame", total_elapsed: float):
+        """
+        saves the results of a bench run to an excel workbook
+        :param filepath: filepath to save the excel document to
+        :param df: one row per game with the BENCH_COLUMNS, any further columns (search, ponder and cache stats) are
+        written after them
+        :param total_elapsed: runtime of the whole bench run in seconds
+        :return:
+        """
+        import pandas as pd
+        import xlwt
         # wew
         # save results to an excel workbook
         book = xlwt.Workbook()
@@ -133,6 +405,9 @@ class BoardManager:
         sheet.write(0, 8, "Elapsed Time (s):", bold_style)
         sheet.write(0, 9, "Depth:", bold_style)
         sheet.write(0, 10, "Outcome:", bold_style)
+        for extra, column in enumerate(df.columns[len(BENCH_COLUMNS):]):
+            sheet.col(11 + extra).width = 256 * 16
+            sheet.write(0, 11 + extra, column.capitalize() + ":", bold_style)
 
         row_num = 1
         for row in df.iterrows():
@@ -142,11 +417,12 @@ class BoardManager:
             sheet.write(row_num, 8, row[2])   # write the elapsed time
             sheet.write(row_num, 9, row[3])   # write the depth
             sheet.write(row_num, 10, row[4])  # write the outcome
+            for extra, value in enumerate(row[len(BENCH_COLUMNS):]):
+                sheet.write(row_num, 11 + extra, value)  # write the search, ponder and cache stats
             row_num += 1
         book.save(filepath)
-        return df
 
-    def fish_bench_test(self, filepath, games_per_difficulty=5, min_difficulty=0, max_difficulty=6) -> pd.DataFrame:
+    def fish_bench_test(self, filepath, games_per_difficulty=5, min_difficulty=0, max_difficulty=6) -> "pd.DataFrame":
         """
         Runs a bench test to evaluate the Thinker against the fish player at various difficulties
         :param filepath: filepath to save the excel document to
@@ -155,6 +431,8 @@ class BoardManager:
         :param max_difficulty: maximum difficulty to iterate to
         :return: pd.Dataframe containing the scores of each game
         """
+        import pandas as pd
+        import xlwt
         df = pd.DataFrame(columns=['Difficulty', 'Thinker Wins', 'Fish Wins'])
         start = time.time()
         # run the tests
@@ -1,40 +1,23 @@
 import random
+import time
 
 import chess
 
+from Evaluator import material_score
+from SearchEngine import AlphaBetaSearch
+from TranspositionTable import zobrist_hash
 
-def score_chessboard(board: chess.Board, k_val=9000, q_val=1000, r_val=550, b_val=350, n_val=350, p_val=100):
 
-    score = 0
-    board_str = str(board)
-
-    for ch in board_str:
-        if ch != '\n' and ch != '.':
-            if ch == 'p':  # enemy pawn
-                score -= p_val
-            elif ch == 'P':  # friendly pawn
-                score += p_val
-            elif ch == 'r':  # enemy rook
-                score -= r_val
-            elif ch == 'R':  # friendly rook
-                score += r_val
-            elif ch == 'b':  # enemy bishop
-                score -= b_val
-            elif ch == 'B':  # friendly bishop
-                score += b_val
-            elif ch == 'n':  # enemy knight
-                score -= n_val
-            elif ch == 'N':  # friendly knight
-                score += n_val
-            elif ch == 'q':  # enemy queen
-                score -= q_val
-            elif ch == 'Q':  # friendly queen
-                score += q_val
-            elif ch == 'k':  # enemy king
-                score -= k_val
-            elif ch == 'K':  # friendly king
-                score += k_val
-    return score
+CACHE_MIN_DEPTH = 2  # subtrees shallower than this are cheaper to search again than to look up
+
+
+def score_chessboard(board: chess.Board, k_val=9000, q_val=1000, r_val=550, b_val=350, n_val=350, p_val=100):
+    """
+    scores the material on the board, white pieces are positive and black pieces are negative
+    :param board: board to score
+    :return: score
+    """
+    return material_score(board, k_val=k_val, q_val=q_val, r_val=r_val, b_val=b_val, n_val=n_val, p_val=p_val)
 
 
 def random_move(moves: list):
@@ -49,56 +32,213 @@ def random_move(moves: list):
 
 class BoardTree:
 
-    def __init__(self, board: chess.Board, max_depth=3, scoring_style="average"):
+    def __init__(self, board: chess.Board, max_depth=3, scoring_style="average", batch_evaluator=None, stats=None,
+                 start_node=None, quiescence=False, quiescence_checks=False, cache=None, tablebase=None):
+        """
+        :param board: board to search
+        :param max_depth: plies to search
+        :param scoring_style: "average" or "minimax"
+        :param batch_evaluator: optional BatchEvaluator that scores whole layers at once
+        :param stats: optional SearchStats to fill in
+        :param start_node: optional node of the board's position from find_node of an earlier tree, its already
+        expanded subtree is kept and only the missing layers below it are generated
+        :param quiescence: True to score the leaves after playing out their captures, see AlphaBetaSearch.quiesce.
+        Leaves are then scored one by one, batch_evaluator is not used
+        :param quiescence_checks: True to also search checks in the quiescence search
+        :param cache: optional EvalCache, nodes with at least CACHE_MIN_DEPTH plies below them are looked up before
+        they are expanded and stored once scored. Its version has to match the scoring style and evaluation, with a
+        cache batch_evaluator is not used
+        :param tablebase: optional EndgameTablebase, nodes below the root that it covers are scored from it and not
+        expanded, with a tablebase batch_evaluator is not used
+        """
         self.start_board = board
-        self.start_node = BoardNode(self.start_board, 0, move_made="NONE")  # get starting node of the tree
+        self.root_ply = len(board.move_stack)
+        self.max_depth = max_depth
+        self.start_node = start_node
+        if self.start_node is None:
+            # the root keeps its own copy, the caller's board moves on while the tree may be reused later
+            self.start_node = BoardNode(self.start_board.copy(), 0, move_made="NONE")  # get starting node of the tree
+        self.reused_nodes = 0
+        self.quiescence = quiescence
+        self.quiescence_checks = quiescence_checks
+        self.qnodes = 0
+        self.cache = cache
+        self.cache_hits = 0
+        self.tablebase = tablebase
+        self.tablebase_hits = 0
         self.layer_nodes = list()
-        self.create_tree(max_depth=max_depth, scoring_style=scoring_style)
-
-    def create_tree(self, max_depth=3, scoring_style="average"):
+        self.create_tree(max_depth=max_depth, scoring_style=scoring_style, batch_evaluator=batch_evaluator,
+                         stats=stats)
+
+    def find_node(self, board: chess.Board, max_depth: int):
+        """
+        follows the moves played since this tree was built down to the node of the board's position
+        :param board: board reached from the root of this tree
+        :param max_depth: depth of the new search, subtrees already deeper than that are not reused
+        :return: BoardNode of the position, or None if it is not in the tree
+        """
+        played = len(board.move_stack) - self.root_ply
+        if played < 0 or self.max_depth - played > max_depth:
+            return None
+        node = self.start_node
+        for move in board.move_stack[self.root_ply:]:
+            uci = move.uci()
+            node = next((child for child in node.children if child.get_move() == uci), None)
+            if node is None:
+                return None
+        if node.board.fen() != board.fen():  # a different game that happens to share the move count
+            return None
+        return node
+
+    def create_tree(self, max_depth=3, scoring_style="average", batch_evaluator=None, stats=None):
+        if scoring_style not in ("average", "minimax"):
+            raise Exception("Invalid scoring style: " + scoring_style)
+        phase_start = time.perf_counter() if stats is not None else 0.0
         depth = 0
-        nodes_to_populate = [self.start_node]
+        self.layer_nodes.append([self.start_node])
+        if self.start_node.is_populated:
+            self.reused_nodes = 1
 
         while depth < max_depth:  # iterate until max_depth is reached
             new_nodes_to_populate = list()
-            current_layer_nodes = list()
-            for node in nodes_to_populate:
-                current_layer_nodes.append(node)
-                new_nodes = node.populate_node()
-                new_nodes_to_populate.extend(new_nodes)
-            self.layer_nodes.append(current_layer_nodes)
+            for node in self.layer_nodes[depth]:
+                if node.is_populated:  # expanded by the tree of an earlier move, keep its children
+                    self.reused_nodes += len(node.children)
+                    new_nodes_to_populate.extend(node.children)
+                elif not self.probe_tablebase(node) and not self.probe_cache(node, max_depth - depth):
+                    new_nodes_to_populate.extend(node.populate_node())
+            self.layer_nodes.append(new_nodes_to_populate)
             depth += 1  # increment depth
-            nodes_to_populate.clear()  # clear nodes to populate
-            nodes_to_populate.extend(new_nodes_to_populate)  # fill nodes to populate with new nodes
-        # append the last layer of nodes to the list of layer nodes
-        self.layer_nodes.append(new_nodes_to_populate)
+
+        if stats is not None:
+            phase_end = time.perf_counter()
+            stats.expand_time += phase_end - phase_start
+            phase_start = phase_end
+            for layer_depth, layer in enumerate(self.layer_nodes):
+                stats.add_nodes(layer_depth, len(layer))
+            stats.leaves += sum(1 for layer in self.layer_nodes[1:] for node in layer
+                                if len(node.children) == 0 and not node.is_cached)
 
         # score the tree based on the scoring style
+        if batch_evaluator is not None and not self.quiescence and self.cache is None and self.tablebase is None:
+            # score whole layers at once
+            batch_evaluator.score_layers(self.layer_nodes, scoring_style, self.start_board.turn == chess.WHITE)
+            if stats is not None:
+                stats.evaluate_time += time.perf_counter() - phase_start
+            return
+
+        # evaluate the leaves first, every node without children is scored from its own board
+        for layer in self.layer_nodes[1:]:
+            for node in layer:
+                if len(node.children) == 0 and not node.is_cached:
+                    if self.probe_tablebase(node):
+                        continue
+                    if self.quiescence:
+                        node.set_score(self.quiescence_score(node.board))
+                    else:
+                        node.set_score(score_chessboard(node.board))
+        if stats is not None:
+            stats.qnodes += self.qnodes
+            phase_end = time.perf_counter()
+            stats.evaluate_time += phase_end - phase_start
+            phase_start = phase_end
+
+        # then back the scores up to the root
         if scoring_style == "average":
             while depth != 0:
                 for node in self.layer_nodes[depth]:
-                    node.score_to_average_of_children()
+                    if len(node.children) > 0:
+                        node.score_to_average_of_children()
                 depth -= 1
 
         elif scoring_style == "minimax":
+            root_is_white = self.start_board.turn == chess.WHITE
             while depth != 0:
-                is_white_turn = bool(depth % 2)
+                is_white_turn = root_is_white == (depth % 2 == 0)  # side to move at this layer
                 for node in self.layer_nodes[depth]:
-                    node.score_node(is_white_turn)
+                    if len(node.children) > 0:
+                        node.score_node(is_white_turn)
                 depth -= 1
-        else:
-            raise Exception("Invalid scoring style: " + scoring_style)
+
+        self.store_cache(max_depth)
+        if stats is not None:
+            stats.backprop_time += time.perf_counter() - phase_start
+
+    def probe_cache(self, node, remaining_depth: int):
+        """
+        looks the subtree of a node up in the cache before it is expanded
+        :param node: BoardNode about to be expanded
+        :param remaining_depth: plies that would be searched below the node
+        :return: True if the cache had its score, the node then stays unexpanded
+        """
+        node.is_cached = False
+        if self.cache is None or remaining_depth < CACHE_MIN_DEPTH or node is self.start_node:
+            return False
+        node.key = zobrist_hash(node.board)
+        score = self.cache.probe(node.key, remaining_depth)
+        if score is None:
+            return False
+        node.set_score(score)
+        node.is_cached = True
+        self.cache_hits += 1
+        return True
+
+    def probe_tablebase(self, node):
+        """
+        scores a node from the endgame tablebase when it covers the node's position
+        :param node: BoardNode about to be expanded or scored
+        :return: True if the tablebase had its score, the node then stays unexpanded
+        """
+        node.is_cached = False
+        if self.tablebase is None or node is self.start_node:
+            return False
+        score = self.tablebase.white_score(node.board)
+        if score is None:
+            return False
+        node.set_score(score)
+        node.is_cached = True
+        self.tablebase_hits += 1
+        return True
+
+    def store_cache(self, max_depth: int):
+        """
+        stores the scores of the expanded nodes that were looked up and missed
+        :param max_depth: depth of the tree
+        :return:
+        """
+        if self.cache is None:
+            return
+        for depth in range(1, max_depth - CACHE_MIN_DEPTH + 1):
+            for node in self.layer_nodes[depth]:
+                if node.key is not None and not node.is_cached and len(node.children) > 0:
+                    self.cache.store(node.key, max_depth - depth, node.get_score())
+
+    def quiescence_score(self, board: chess.Board):
+        """
+        scores a leaf once its captures are played out
+        :param board: board of the leaf
+        :return: score, white pieces are positive and black pieces are negative like score_chessboard
+        """
+        search = AlphaBetaSearch(board, max_depth=0, quiescence=True, quiescence_checks=self.quiescence_checks)
+        score = search.search()
+        self.qnodes += search.get_qnode_count()
+        if board.turn == chess.WHITE:
+            return score
+        return -score
 
     def choose_best_scoring_move(self):
         best_score = -999999
         possible_best_moves = list()
+        # scores are from white's point of view, flip them when black is choosing
+        sign = 1 if self.start_board.turn == chess.WHITE else -1
 
         for node in self.layer_nodes[1]:
-            if node.get_score() > best_score:
+            score = sign * node.get_score()
+            if score > best_score:
                 possible_best_moves.clear()
                 possible_best_moves.append(node.get_move())
-                best_score = node.get_score()
-            elif node.get_score() == best_score:
+                best_score = score
+            elif score == best_score:
                 possible_best_moves.append(node.get_move())
 
         # DEBUG
@@ -106,6 +246,21 @@ class BoardTree:
             print('wew')
         return possible_best_moves
 
+    def get_node_count(self):
+        return sum(len(layer) for layer in self.layer_nodes)
+
+    def get_reused_node_count(self):
+        return self.reused_nodes
+
+    def get_qnode_count(self):
+        return self.qnodes
+
+    def get_cache_hit_count(self):
+        return self.cache_hits
+
+    def get_tablebase_hit_count(self):
+        return self.tablebase_hits
+
     def figure_move(self, depth=3):
         move = random_move(self.choose_best_scoring_move())
         return move
@@ -121,6 +276,8 @@ class BoardNode:
         self.children = list()
 
         self.is_populated = False
+        self.is_cached = False  # score came from an EvalCache or a tablebase instead of expanding the node
+        self.key = None  # zobrist hash, only set for nodes looked up in an EvalCache
 
     def __add__(self, other):
         return other + self.score
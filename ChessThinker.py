@@ -4,13 +4,28 @@
 # 9/10/21
 ##
 import random
+import time
+
 import chess
-from BoardTree import BoardTree
+from BoardTree import BoardTree, score_chessboard
+from CompactTree import CompactBoardTree
+from EndgameTablebase import EndgameTablebase
+from EvalCache import EvalCache, cache_version
+from Evaluator import MaterialEvaluator
+from MonteCarloSearch import DEFAULT_PLAYOUTS, ROLLOUT_STYLES, MonteCarloSearch
+from SearchEngine import AlphaBetaSearch, IterativeDeepening, PositionSearch, SearchTimeout
+from SearchStats import SearchStats
+from MoveOrdering import MoveOrderer
+from OpeningBook import OpeningBook
+from Pondering import Ponderer
+from Position import Position
+from TranspositionTable import TranspositionTable
 
 from operator import itemgetter
 
 
-EMPTY = "_"
+SEARCH_STYLES = ["tree", "compact", "alphabeta", "native", "parallel", "mcts", "greedy", "greedy2"]
+SCORING_STYLES = ["average", "minimax"]
 
 
 def random_move(moves: list):
@@ -30,6 +45,33 @@ class ChessThinker:
         self.is_random = True
         self.depth = 3
         self.game_state = ""
+        self.search_style = "tree"
+        self.scoring_style = "average"
+        self.table = None
+        self.move_orderer = MoveOrderer()
+        self.batch_evaluator = None
+        self.time_ms = None
+        self.workers = None
+        self.parallel_search = None
+        self.playouts = DEFAULT_PLAYOUTS
+        self.rollout_style = "random"
+        self.rollout_pool = None  # process pool of the "mcts" playouts
+        self.search_stats = dict()
+        self.instrument = False
+        self.move_stats = list()  # SearchStats of every move since clear_move_stats, when instrumenting
+        self.current_stats = None
+        self.reuse_tree = True
+        self.tree = None  # BoardTree of the last "tree" search, kept for the next move
+        self.book = None
+        self.eval_cache = None
+        self.tablebase = None
+        self.greedy_nodes = 0
+        self.quiescence = False
+        self.quiescence_checks = False
+        self.ponder = False
+        self.ponder_all = False
+        self.ponderer = Ponderer()
+        self.last_pv = list()  # principal variation of the last alpha-beta search, predicts the opponent's reply
 
     def set_depth(self, depth: int):
         self.depth = depth
@@ -37,119 +79,611 @@ class ChessThinker:
     def get_depth(self):
         return self.depth
 
-    def read_fen(self, fen: str):
+    def configure(self, depth=None, search_style=None, scoring_style=None, time_ms=None, table_size=None,
+                  instrument=None, ponder=None, quiescence=None, book=None, cache=None, tablebase=None, playouts=None,
+                  rollout_style=None):
         """
-        reads a fen position
-        :param fen: fen string representation
+        applies several settings at once, settings left as None are not changed
+        :param depth: search depth
+        :param search_style: see set_search_style
+        :param scoring_style: "average" or "minimax"
+        :param time_ms: time budget per move in milliseconds
+        :param table_size: transposition table size in megabytes
+        :param instrument: record SearchStats for every move
+        :param ponder: search on the opponent's time
+        :param quiescence: extend the leaves with a capture only search
+        :param book: path of a Polyglot opening book
+        :param cache: path of a persistent evaluation cache file
+        :param tablebase: directory of Syzygy endgame tables
+        :param playouts: playouts per move of the "mcts" style
+        :param rollout_style: playouts of the "mcts" style, see set_monte_carlo
+        :return:
+        """
+        if depth is not None:
+            self.set_depth(depth)
+        if search_style is not None:
+            self.set_search_style(search_style)
+        if scoring_style is not None:
+            self.set_scoring_style(scoring_style)
+        if time_ms is not None:
+            self.set_time_budget(time_ms)
+        if table_size is not None:
+            self.set_table_size(table_size)
+        if instrument is not None:
+            self.set_instrumentation(instrument)
+        if ponder is not None:
+            self.set_pondering(ponder)
+        if quiescence is not None:
+            self.set_quiescence(quiescence)
+        if book is not None:
+            self.set_opening_book(book)
+        if cache is not None:
+            self.set_eval_cache(cache)
+        if tablebase is not None:
+            self.set_tablebase(tablebase)
+        if playouts is not None or rollout_style is not None:
+            self.set_monte_carlo(playouts=playouts, rollout_style=rollout_style)
+
+    def set_instrumentation(self, enabled: bool):
+        """
+        records nodes per depth, leaves, nodes per second, branching factor and expand/evaluate/back-propagate
+        timings for every move
+        :param enabled: True to record
+        :return:
+        """
+        self.instrument = enabled
+
+    def clear_move_stats(self):
+        self.stop_pondering()
+        self.move_stats = list()
+        self.ponderer.reset_stats()
+        if self.eval_cache is not None:
+            self.eval_cache.reset_stats()
+        if self.tablebase is not None:
+            self.tablebase.reset_stats()
+
+    def get_move_stats(self):
+        """
+        :return: list of SearchStats, one for every move since clear_move_stats
+        """
+        return self.move_stats
+
+    def get_game_stats(self):
+        """
+        :return: SearchStats summed over every move since clear_move_stats
+        """
+        game_stats = SearchStats()
+        for stats in self.move_stats:
+            game_stats.merge(stats)
+        return game_stats
+
+    def set_tree_reuse(self, enabled: bool):
+        """
+        keeps the BoardTree of the "tree" search style between moves. After the opponent replies the subtree of the
+        position reached is already expanded and scored up to depth - 2, so only the missing layers are generated.
+        The alpha-beta styles reuse their transposition table the same way when one is set
+        :param enabled: True to keep the tree
         :return:
         """
-        iteration = 0
+        self.reuse_tree = enabled
+        self.tree = None
 
-        # initialize lists for the board representation
-        board = list()
-        row_contents = list()
+    def set_opening_book(self, book):
+        """
+        plays straight from an opening book while the position is in it, generate_move does not search then
+        :param book: path of a Polyglot .bin file, an OpeningBook, or None to stop using a book
+        :return:
+        """
+        if self.book is not None and self.book is not book:
+            self.book.close()
+        self.book = OpeningBook(book) if isinstance(book, str) else book
 
-        board_str_len = 0
+    def get_book_stats(self):
+        """
+        :return: dict of the book hits, misses and hit rate, empty without a book
+        """
+        if self.book is None:
+            return dict()
+        return self.book.get_stats()
 
-        while fen[board_str_len] != " ":
-            board_str_len += 1
+    def set_eval_cache(self, path, size_mb=64):
+        """
+        keeps the scores of the "tree" search's subtrees in a file that outlives the process and is shared by every
+        thinker opening the same file, see EvalCache
+        :param path: cache file, None to stop using a cache
+        :param size_mb: size of the file when it is created
+        :return:
+        """
+        if self.eval_cache is not None:
+            self.eval_cache.close()
+        self.eval_cache = EvalCache(path, size_mb=size_mb) if path is not None else None
 
-        # read in data from the first fen string representing the board
-        for i in range(board_str_len):
-            ch = fen[i]
-            if ch == "/":  # skip every forward slash
-                iteration += 1
-                board.append(row_contents)
-                row_contents = list()
-            else:
-                if ch.isnumeric():  # check for numeric fen values, indicating empty spaces
-                    for _ in range(int(ch)):
-                        row_contents.append(EMPTY)
-                else:
-                    row_contents.append(ch)
-        board.append(row_contents)  # append last to the board
-        board_str_len += 1  # skip the space between the initial string and the red of the FEN notation
+    def get_cache_stats(self):
+        """
+        :return: dict of the cache hits, misses, stores and hit rate, empty without a cache
+        """
+        if self.eval_cache is None:
+            return dict()
+        return self.eval_cache.get_stats()
+
+    def set_tablebase(self, tablebase, max_pieces=None):
+        """
+        plays and scores endgames from Syzygy tables. A position the tables cover is not searched, generate_move
+        plays the move that converts the fastest, and the "tree", "alphabeta" and time budget searches score the
+        covered positions below the root by their result instead of their material
+        :param tablebase: directory of .rtbw/.rtbz files, an EndgameTablebase, or None to stop using tables
+        :param max_pieces: most pieces of a probed position, defaults to the largest table
+        :return:
+        """
+        if self.tablebase is not None and self.tablebase is not tablebase:
+            self.tablebase.close()
+        if isinstance(tablebase, str):
+            tablebase = EndgameTablebase(tablebase, max_pieces=max_pieces)
+        self.tablebase = tablebase
 
-    def generate_move(self):
-        legal_moves = list()
-        legal_moves.extend(self.board.legal_moves)
+    def get_tablebase_stats(self):
+        """
+        :return: dict of the tablebase probes, hits and probe cache hits, empty without a tablebase
+        """
+        if self.tablebase is None:
+            return dict()
+        return self.tablebase.get_stats()
+
+    def set_quiescence(self, enabled: bool, checks=False):
+        """
+        scores the leaves of the search only after their captures and promotions are played out, so a leaf in the
+        middle of an exchange does not decide the move. Used by the "tree", "alphabeta" and "parallel" styles and the
+        time budget search, the "compact" style always scores the leaves as they are. Off by default, since with it
+        alpha-beta no longer picks the same moves as a plain minimax tree
+        :param enabled: True to extend the leaves
+        :param checks: True to also search checking moves on the first ply of the extension and all replies to check
+        :return:
+        """
+        self.quiescence = enabled
+        self.quiescence_checks = checks
+        self.close()  # the worker processes of the "parallel" style are started with the old setting
+
+    def set_pondering(self, enabled: bool, all_replies=False):
+        """
+        searches on the opponent's time. After our move start_pondering searches the position after the opponent's
+        predicted reply (or after every reply) in a background thread, generate_move then uses that result when the
+        opponent played a pondered reply. Only the alpha-beta searches can be stopped when the opponent plays
+        something else, so only a time budget or the "alphabeta" style ponder
+        :param enabled: True to ponder
+        :param all_replies: True to go on with the other replies once the predicted one is searched, only for the
+        fixed depth "alphabeta" style
+        :return:
+        """
+        self.ponder = enabled
+        self.ponder_all = all_replies
+        if not enabled:
+            self.stop_pondering()
+
+    def get_ponder_stats(self):
+        """
+        :return: dict of the ponder hits, misses and hit rate since clear_move_stats
+        """
+        return self.ponderer.get_stats()
+
+    def start_pondering(self):
+        """
+        starts searching on the opponent's time, call it once our move is on the board
+        :return: True if pondering started
+        """
+        if not self.ponder or self.board.is_game_over():
+            return False
+        if self.search_style == "mcts" or (self.time_ms is None and self.search_style != "alphabeta"):
+            return False
+
+        replies = list(self.board.legal_moves)
+        MoveOrderer().order(self.board, replies, 0)
+        # the second move of our principal variation is the reply we expect
+        if len(self.last_pv) > 1 and len(self.board.move_stack) > 0 and self.last_pv[0] == self.board.peek() and \
+                self.last_pv[1] in replies:
+            replies.remove(self.last_pv[1])
+            replies.insert(0, self.last_pv[1])
+        if not self.ponder_all or self.time_ms is not None:
+            replies = replies[:1]
+        self.ponderer.start(self.board, replies, self.ponder_search)
+        return True
+
+    def ponder_search(self, board: chess.Board, stop_event):
+        """
+        search run by the ponder thread, the time budget search goes on until it is stopped
+        :param board: position after one of the opponent's replies
+        :param stop_event: threading.Event that stops the search
+        :return: dict with the best moves, principal variation and nodes, None if the search was stopped too early
+        """
+        self.start_search()
+        if self.time_ms is not None:
+            search = IterativeDeepening(board, table=self.table, orderer=self.move_orderer, stop_event=stop_event,
+                                        quiescence=self.quiescence, quiescence_checks=self.quiescence_checks,
+                                        tablebase=self.tablebase)
+            best_moves = search.search(None)
+            if len(best_moves) == 0:
+                return None
+            return {"moves": best_moves, "pv": search.pv, "nodes": search.nodes, "depth": search.completed_depth}
+
+        search = AlphaBetaSearch(board, max_depth=self.depth, table=self.table, orderer=self.move_orderer,
+                                 stop_event=stop_event, quiescence=self.quiescence,
+                                 quiescence_checks=self.quiescence_checks, tablebase=self.tablebase)
+        try:
+            best_moves = search.choose_best_scoring_move()
+        except SearchTimeout:
+            return None
+        return {"moves": best_moves, "pv": search.get_pv(), "nodes": search.get_node_count()}
+
+    def stop_pondering(self):
+        self.ponderer.stop()
+
+    def set_time_budget(self, time_ms):
+        """
+        makes generate_move search by time instead of by depth
+        :param time_ms: milliseconds to spend on every move, None to go back to the fixed depth
+        :return:
+        """
+        self.time_ms = time_ms
 
-        move = self.adversarial_search()
+    def get_time_budget(self):
+        return self.time_ms
 
-        return str(move)
+    def set_workers(self, workers):
+        """
+        sets how many processes the "parallel" and "mcts" search styles use
+        :param workers: number of worker processes, None for one per cpu with the "parallel" style and for playouts
+        in this process with the "mcts" style
+        :return:
+        """
+        self.workers = workers
+        self.close()
+
+    def close(self):
+        """
+        stops pondering and the worker processes of the "parallel" and "mcts" search styles
+        :return:
+        """
+        self.stop_pondering()
+        if self.parallel_search is not None:
+            self.parallel_search.shutdown()
+            self.parallel_search = None
+        if self.rollout_pool is not None:
+            self.rollout_pool.shutdown()
+            self.rollout_pool = None
+
+    def set_monte_carlo(self, playouts=None, rollout_style=None):
+        """
+        sets up the "mcts" search style, settings left as None are not changed
+        :param playouts: playouts per move, a time budget replaces it when one is set
+        :param rollout_style: "random" plays the playouts out like RandomPlayer, "greedy" like the "greedy" style
+        :return:
+        """
+        if rollout_style is not None:
+            rollout_style = rollout_style.lower()
+            if rollout_style not in ROLLOUT_STYLES:
+                raise Exception("Invalid rollout style: " + str(rollout_style))
+            self.rollout_style = rollout_style
+        if playouts is not None:
+            self.playouts = playouts
+
+    def set_search_style(self, search_style: str):
+        """
+        sets how adversarial_search looks for a move
+        :param search_style: "tree" builds a full BoardTree, "compact" builds the same tree in flat arrays,
+        "alphabeta" runs a depth-first alpha-beta search, "native" runs the same search on the thinker's own Position
+        board without a transposition table, move ordering or quiescence, "parallel" splits the alpha-beta search of
+        the root moves across worker processes, "mcts" grows a Monte Carlo tree from playouts instead of searching to
+        a depth, "greedy" and "greedy2" ignore the depth and only look one or two plies ahead
+        :return:
+        """
+        search_style = search_style.lower()
+        if search_style not in SEARCH_STYLES:
+            raise Exception("Invalid search style: " + str(search_style))
+        self.search_style = search_style
+
+    def get_search_style(self):
+        return self.search_style
+
+    def set_scoring_style(self, scoring_style: str):
+        scoring_style = scoring_style.lower()
+        if scoring_style not in SCORING_STYLES:
+            raise Exception("Invalid scoring style: " + str(scoring_style))
+        self.scoring_style = scoring_style
+
+    def get_scoring_style(self):
+        return self.scoring_style
+
+    def set_table_size(self, size_mb: float):
+        """
+        gives the alpha-beta search a transposition table that is kept between moves
+        :param size_mb: memory cap of the table in megabytes, 0 turns the table off
+        :return:
+        """
+        if size_mb <= 0:
+            self.table = None
+        else:
+            self.table = TranspositionTable(size_mb=size_mb)
+
+    def set_move_ordering(self, enabled: bool):
+        """
+        turns MVV-LVA / killer / history move ordering of the alpha-beta search on or off
+        :param enabled: True to order moves
+        :return:
+        """
+        self.move_orderer = MoveOrderer() if enabled else None
+
+    def set_batch_evaluator(self, batch_evaluator):
+        """
+        scores the tree search layer by layer with a BatchEvaluator instead of one node at a time
+        :param batch_evaluator: BatchEvaluator or None
+        :return:
+        """
+        self.batch_evaluator = batch_evaluator
+
+    def get_search_stats(self):
+        """
+        :return: dict of counters from the last search (nodes and transposition table hits/misses/collisions)
+        """
+        return self.search_stats
+
+    def read_fen(self, fen: str):
+        """
+        reads a fen position into the thinker's own board representation
+        :param fen: fen string representation
+        :return: Position
+        """
+        return Position.from_fen(fen)
+
+    def generate_move(self, time_ms=None):
+        """
+        figures out the move to play on the current board
+        :param time_ms: optional time budget in milliseconds, overrides the budget from set_time_budget
+        :return: move in uci notation, None when the search found no move
+        """
+        if time_ms is None:
+            time_ms = self.time_ms
+
+        if self.instrument:
+            self.current_stats = SearchStats()
+            start = time.perf_counter()
+
+        book_move = self.book.choose_move(self.board) if self.book is not None else None
+        tablebase_moves = None
+        if book_move is None and self.tablebase is not None:
+            tablebase_moves = self.tablebase.choose_moves(self.board)
+        pondered = None
+        if book_move is not None or tablebase_moves is not None:
+            self.stop_pondering()
+        elif self.ponderer.is_pondering():
+            # a time budget search of the reply goes on for the budget, a fixed depth search until it is done
+            pondered = self.ponderer.finish(self.board, timeout=time_ms / 1000 if time_ms is not None else None)
+
+        if book_move is not None:
+            move = book_move
+            self.last_pv = list()
+            self.search_stats = {"nodes": 0, "book_hit": True}
+        elif tablebase_moves is not None:
+            move = random_move(tablebase_moves)
+            self.last_pv = list()
+            self.search_stats = {"nodes": 0, "tablebase_hit": True}
+        elif pondered is not None:
+            move = random_move(pondered["moves"])
+            self.last_pv = pondered["pv"]
+            self.search_stats = {"nodes": pondered["nodes"], "ponder_hit": True}
+        elif self.search_style == "mcts":  # bounded by the time budget itself when there is one
+            move = self.monte_carlo_search(time_ms)
+        elif time_ms is not None:
+            move = self.timed_search(time_ms)
+        else:
+            move = self.adversarial_search()
+
+        if self.instrument:
+            self.current_stats.elapsed = time.perf_counter() - start
+            self.move_stats.append(self.current_stats)
+            for key, value in self.current_stats.as_dict().items():  # counters of the search itself come first
+                self.search_stats.setdefault(key, value)
+            self.current_stats = None
+
+        return str(move) if move is not None else None
+
+    def timed_search(self, time_ms: int):
+        """
+        iterative deepening alpha-beta search, returns the best move of the deepest search finished in time
+        :param time_ms: time budget in milliseconds
+        :return: move
+        """
+        self.start_search()
+        search = IterativeDeepening(self.board, table=self.table, orderer=self.move_orderer, stats=self.current_stats,
+                                    quiescence=self.quiescence, quiescence_checks=self.quiescence_checks,
+                                    tablebase=self.tablebase)
+        move = search.figure_move(time_ms)
+        self.last_pv = search.pv
+        self.finish_search({"nodes": search.nodes, "qnodes": search.qnodes, "depth": search.completed_depth})
+        return move
+
+    def monte_carlo_search(self, time_ms=None):
+        """
+        Monte Carlo tree search. The playouts run in a process pool when more than one worker was set with
+        set_workers, and in this process otherwise. Thinkers playing in the worker processes of a match, a dataset
+        run or a parallel bench always play out in their own process, a pool per worker would start a process for
+        every cpu in every worker
+        :param time_ms: optional time budget in milliseconds, without one the search runs the set number of playouts
+        :return: move, None when there is no legal move
+        """
+        workers = self.workers if self.workers is not None else 1
+        if workers > 1:
+            import multiprocessing
+            if multiprocessing.parent_process() is not None:
+                workers = 1
+        if self.rollout_pool is None and workers > 1:
+            from concurrent.futures import ProcessPoolExecutor
+            self.rollout_pool = ProcessPoolExecutor(max_workers=workers)
+        search = MonteCarloSearch(self.board, playouts=self.playouts if time_ms is None else None, time_ms=time_ms,
+                                  rollout_style=self.rollout_style, executor=self.rollout_pool, workers=workers)
+        move = search.figure_move()
+        self.last_pv = list()
+        self.search_stats = {"nodes": search.get_node_count(), "playouts": search.get_playout_count()}
+        return move
+
+    def start_search(self):
+        """
+        clears the per move state of the transposition table and move orderer before a new alpha-beta search
+        :return:
+        """
+        if self.table is not None:
+            self.table.new_search()
+        if self.move_orderer is not None:
+            self.move_orderer.new_search()
+
+    def finish_search(self, stats: dict):
+        """
+        saves the counters of the finished search together with the table and move ordering counters
+        :param stats: counters of the search itself
+        :return:
+        """
+        if self.table is not None:
+            stats.update(self.table.get_stats())
+        if self.move_orderer is not None:
+            stats.update(self.move_orderer.get_stats())
+        self.search_stats = stats
 
     def best_apparent_move(self, moves: list, debug=False):
-        current_fen = self.board.fen()
-        test_board = chess.Board(fen=current_fen)
+        """
+        one ply "greedy" search, picks the move that leaves the side to move with the most material
+        :param moves: legal moves of the current board
+        :param debug: print the board first
+        :return: move
+        """
+        test_board = self.board.copy(stack=False)
         if debug:
             print(test_board, "\n")
-        scores_and_moves = list()
-        for mv in moves:
-            move = str(mv)
-            test_board.push_uci(move)  # do the move on the board
-            score = score_chessboard(test_board)  # evaluate the new board
-            scores_and_moves.append((score, move))  # save score and move
-            test_board.set_fen(current_fen)  # reset board
-
-        # TODO: use score used by stockfish/chess board
+        sign = 1 if test_board.turn == chess.WHITE else -1  # scores are from white's point of view
 
         # initialize max score
         max_score = -900000
         possible_moves = list()
-        # get the highest scores
-        for tup in scores_and_moves:
-            if tup[0] > max_score:
+        for move in moves:
+            test_board.push(move)  # do the move on the board
+            score = sign * score_chessboard(test_board)  # evaluate the new board
+            test_board.pop()  # take the move back
+            if score > max_score:
                 possible_moves.clear()  # clear the list as better moves were found
-                possible_moves.append(tup[1])  # append the new best move
-                max_score = tup[0]  # set new max score
-            elif tup[0] == max_score:
-                possible_moves.append(tup[1])  # append possible new best move
-
+                possible_moves.append(move)  # append the new best move
+                max_score = score  # set new max score
+            elif score == max_score:
+                possible_moves.append(move)  # append possible new best move
+        self.greedy_nodes = len(moves) + 1
         return random_move(possible_moves)
 
-    def adversarial_search_old(self, moves: list):
-
-        current_fen = self.board.fen()
-        test_board = chess.Board(fen=current_fen)
-        scores_and_moves = list()
+    def greedy_reply_move(self, moves: list):
+        """
+        two ply "greedy2" search, picks the move that leaves the side to move with the most material after the
+        opponent's best reply
+        :param moves: legal moves of the current board
+        :return: move
+        """
+        test_board = self.board.copy(stack=False)
+        self.greedy_nodes = len(moves) + 1
 
-        for mv in moves:
-            move = str(mv)
-            test_board.push_uci(move)
-            scores_and_moves.append((self.adversarial_likely_opponent_score(test_board), move))
-            test_board.set_fen(current_fen)  # reset board after testing possible move
         # initialize max score
         max_score = -900000
         possible_moves = list()
-        # get the highest scores
-        for tup in scores_and_moves:
-            if tup[0] > max_score:
+        for move in moves:
+            test_board.push(move)
+            score = self.likely_opponent_score(test_board)
+            test_board.pop()  # take the move back after testing it
+            if score > max_score:
                 possible_moves.clear()  # clear the list as better moves were found
-                possible_moves.append(tup[1])  # append the new best move
-                max_score = tup[0]  # set new max score
-            elif tup[0] == max_score:
-                possible_moves.append(tup[1])  # append possible new best move
+                possible_moves.append(move)  # append the new best move
+                max_score = score  # set new max score
+            elif score == max_score:
+                possible_moves.append(move)  # append possible new best move
         return random_move(possible_moves)
 
-    def adversarial_likely_opponent_score(self, board: chess.Board):
-
-        current_fen = board.fen()
-        legal_moves = list()
-        legal_moves.extend(board.legal_moves)
-        scores = list()
-
-        for mv in legal_moves:
-            move = str(mv)
-            board.push_uci(move)
-            score = score_chessboard(board)
-            scores.append(score)
-            board.set_fen(current_fen)  # reset board
-
-        return min(scores)
+    def likely_opponent_score(self, board: chess.Board):
+        """
+        :param board: board with the opponent to move
+        :return: score of the side that just moved after the opponent's reply that is worst for it
+        """
+        sign = -1 if board.turn == chess.WHITE else 1  # scores are from white's point of view
+        min_score = sign * score_chessboard(board)  # no reply, the game is over
+        first = True
+        for move in board.legal_moves:
+            board.push(move)
+            score = sign * score_chessboard(board)
+            board.pop()
+            self.greedy_nodes += 1
+            if first or score < min_score:
+                min_score = score
+                first = False
+        return min_score
 
     def adversarial_search(self):
 
-        tree = BoardTree(self.board, max_depth=self.depth, scoring_style="average")
+        if self.search_style == "mcts":
+            return self.monte_carlo_search(self.time_ms)
+
+        if self.search_style in ("greedy", "greedy2"):
+            moves = list(self.board.legal_moves)
+            if self.search_style == "greedy":
+                move = self.best_apparent_move(moves)
+            else:
+                move = self.greedy_reply_move(moves)
+            self.search_stats = {"nodes": self.greedy_nodes}
+            return move
+
+        if self.search_style == "alphabeta":
+            # alpha-beta always scores like the "minimax" style of the tree
+            self.start_search()
+            search = AlphaBetaSearch(self.board, max_depth=self.depth, table=self.table, orderer=self.move_orderer,
+                                     stats=self.current_stats, quiescence=self.quiescence,
+                                     quiescence_checks=self.quiescence_checks, tablebase=self.tablebase)
+            move = search.figure_move()
+            self.last_pv = search.get_pv()
+            self.finish_search({"nodes": search.get_node_count(), "qnodes": search.get_qnode_count(),
+                                "tablebase_hits": search.get_tablebase_hit_count()})
+            return move
+
+        if self.search_style == "native":
+            search = PositionSearch(Position.from_board(self.board), max_depth=self.depth, stats=self.current_stats)
+            move = search.figure_move()
+            self.search_stats = {"nodes": search.get_node_count()}
+            return move
+
+        if self.search_style == "parallel":
+            if self.parallel_search is None:
+                from ParallelSearch import ParallelRootSearch  # multiprocessing is only loaded for this style
+                self.parallel_search = ParallelRootSearch(workers=self.workers, quiescence=self.quiescence,
+                                                          quiescence_checks=self.quiescence_checks)
+            move = self.parallel_search.figure_move(self.board, self.depth)
+            self.search_stats = {"nodes": self.parallel_search.nodes, "qnodes": self.parallel_search.qnodes,
+                                 "workers": self.parallel_search.workers}
+            return move
+
+        if self.search_style == "compact":
+            tree = CompactBoardTree(self.board, max_depth=self.depth, scoring_style=self.scoring_style,
+                                    stats=self.current_stats)
+            move = tree.figure_move()
+            self.search_stats = {"nodes": tree.get_node_count(), "tree_bytes": tree.get_memory_usage()}
+            return move
+
+        start_node = None
+        if self.reuse_tree and self.tree is not None:
+            start_node = self.tree.find_node(self.board, self.depth)
+        self.tree = None  # frees everything outside the reused subtree before the new tree is built
+        if self.eval_cache is not None:
+            settings = [MaterialEvaluator().weights, self.scoring_style, self.quiescence, self.quiescence_checks]
+            if self.tablebase is not None:  # tablebase scores replace material scores up to its piece count
+                settings.append(self.tablebase.max_pieces)
+            self.eval_cache.version = cache_version(*settings)
+        tree = BoardTree(self.board, max_depth=self.depth, scoring_style=self.scoring_style,
+                         batch_evaluator=self.batch_evaluator, stats=self.current_stats, start_node=start_node,
+                         quiescence=self.quiescence, quiescence_checks=self.quiescence_checks, cache=self.eval_cache,
+                         tablebase=self.tablebase)
+        if self.reuse_tree:
+            self.tree = tree
         move = tree.figure_move()
+        self.search_stats = {"nodes": tree.get_node_count(), "qnodes": tree.get_qnode_count(),
+                             "reused_nodes": tree.get_reused_node_count(), "cache_hits": tree.get_cache_hit_count(),
+                             "tablebase_hits": tree.get_tablebase_hit_count()}
         return move
 
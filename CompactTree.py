@@ -0,0 +1,211 @@
+
+##
+# Compact array backed search tree
+##
+import random
+import time
+from array import array
+
+import chess
+
+from Evaluator import MaterialEvaluator
+
+
+def encode_move(move: chess.Move):
+    """
+    packs a move into 15 bits: from square, to square and promotion piece type
+    :param move: chess.Move
+    :return: int
+    """
+    return move.from_square | (move.to_square << 6) | ((move.promotion or 0) << 12)
+
+
+def decode_move(value: int):
+    return chess.Move(value & 63, (value >> 6) & 63, promotion=(value >> 12) or None)
+
+
+def random_move(moves: list):
+    """
+    generates a random move from the legal possible moves
+    ":param moves: list of valid moves for a given game state
+    :return: move
+    """
+    idx = random.randint(0, len(moves) - 1)
+    return moves[idx]
+
+
+class CompactBoardTree:
+    """
+    Same breadth-first tree and scoring styles as BoardTree, but nodes are rows of parallel arrays instead of
+    BoardNode objects: the move that led to the node (int16), the parent index, the offset and count of the children
+    and the score (float32). Boards are not stored, they are rebuilt from the move path when a layer is expanded.
+    Nodes are laid out layer by layer, so layer_nodes holds a range of node indices per layer.
+    """
+
+    def __init__(self, board: chess.Board, max_depth=3, scoring_style="average", evaluator=None, stats=None):
+        self.start_board = board.copy()
+        self.evaluator = evaluator if evaluator is not None else MaterialEvaluator()
+
+        self.moves = array("h", [0])
+        self.parents = array("i", [-1])
+        self.child_offsets = array("i", [0])
+        self.child_counts = array("h", [0])
+        self.scores = array("f", [self.evaluator.evaluate(self.start_board)])
+
+        self.layer_nodes = list()
+        self.create_tree(max_depth=max_depth, scoring_style=scoring_style, stats=stats)
+
+    def __len__(self):
+        return len(self.moves)
+
+    def create_tree(self, max_depth=3, scoring_style="average", stats=None):
+        if scoring_style not in ("average", "minimax"):
+            raise Exception("Invalid scoring style: " + scoring_style)
+        phase_start = time.perf_counter() if stats is not None else 0.0
+
+        self.layer_nodes.append(range(0, 1))
+        for depth in range(max_depth):
+            layer = self.layer_nodes[depth]
+            self.expand_layer(layer)
+            self.layer_nodes.append(range(layer.stop, len(self.moves)))
+
+        if stats is not None:
+            # leaves are scored while they are created, so evaluation is part of the expand time
+            phase_end = time.perf_counter()
+            stats.expand_time += phase_end - phase_start
+            phase_start = phase_end
+            for depth, layer in enumerate(self.layer_nodes):
+                stats.add_nodes(depth, len(layer))
+            stats.leaves += sum(1 for node in range(1, len(self.moves)) if self.child_counts[node] == 0)
+
+        # back the scores up from the leaves, the leaf scores were set when they were created
+        root_is_white = self.start_board.turn == chess.WHITE
+        for depth in range(max_depth - 1, 0, -1):
+            is_white_turn = root_is_white == (depth % 2 == 0)  # side to move at this layer
+            self.score_layer(self.layer_nodes[depth], scoring_style, is_white_turn)
+
+        if stats is not None:
+            stats.backprop_time += time.perf_counter() - phase_start
+
+    def expand_layer(self, layer: range):
+        """
+        adds the children of every node of a layer to the end of the arrays. The board is walked from node to node
+        with push/pop, and every child is scored from its parent's score and the material the move changes
+        :param layer: range of node indices to expand
+        :return:
+        """
+        board = self.start_board.copy()
+        path = list()
+        for node in layer:
+            self.move_board_to(board, path, node)
+            legal_moves = list(board.legal_moves)
+            self.child_offsets[node] = len(self.moves)
+            self.child_counts[node] = len(legal_moves)
+            score = self.scores[node]
+            for move in legal_moves:
+                self.moves.append(encode_move(move))
+                self.parents.append(node)
+                self.child_offsets.append(0)
+                self.child_counts.append(0)
+                self.scores.append(score + self.evaluator.move_delta(board, move))
+
+    def get_path(self, node: int):
+        """
+        :param node: node index
+        :return: list of node indices from the first layer down to the node
+        """
+        path = list()
+        while node > 0:
+            path.append(node)
+            node = self.parents[node]
+        path.reverse()
+        return path
+
+    def move_board_to(self, board: chess.Board, path: list, node: int):
+        """
+        pops and pushes moves on the board until it shows the given node, only the part of the path that differs
+        from the previous node is replayed
+        :param board: board currently showing the last node of path
+        :param path: node indices currently applied to the board, updated in place
+        :param node: node index to move to
+        :return:
+        """
+        target = self.get_path(node)
+        common = 0
+        while common < len(path) and common < len(target) and path[common] == target[common]:
+            common += 1
+        while len(path) > common:
+            board.pop()
+            path.pop()
+        for idx in target[common:]:
+            board.push(decode_move(self.moves[idx]))
+            path.append(idx)
+
+    def get_board(self, node: int):
+        """
+        rebuilds the board of a node from its move path
+        :param node: node index
+        :return: chess.Board
+        """
+        board = self.start_board.copy()
+        for idx in self.get_path(node):
+            board.push(decode_move(self.moves[idx]))
+        return board
+
+    def score_layer(self, layer: range, scoring_style: str, is_white_turn: bool):
+        scores = self.scores
+        for node in layer:
+            count = self.child_counts[node]
+            if count == 0:  # leaf node, keeps its material score
+                continue
+            offset = self.child_offsets[node]
+            children = scores[offset:offset + count]
+            if scoring_style == "average":
+                scores[node] = sum(children) / count
+            elif is_white_turn:
+                scores[node] = max(children)
+            else:
+                scores[node] = min(children)
+
+    def get_score(self, node: int):
+        return self.scores[node]
+
+    def get_move(self, node: int):
+        return decode_move(self.moves[node]).uci()
+
+    def get_node_count(self):
+        return len(self.moves)
+
+    def get_memory_per_node(self):
+        """
+        :return: bytes used by one node across all of the arrays
+        """
+        return sum(arr.itemsize for arr in (self.moves, self.parents, self.child_offsets, self.child_counts,
+                                            self.scores))
+
+    def get_memory_usage(self):
+        """
+        :return: bytes held by the node arrays
+        """
+        return sum(arr.buffer_info()[1] * arr.itemsize for arr in (self.moves, self.parents, self.child_offsets,
+                                                                     self.child_counts, self.scores))
+
+    def choose_best_scoring_move(self):
+        best_score = -999999
+        possible_best_moves = list()
+        # scores are from white's point of view, flip them when black is choosing
+        sign = 1 if self.start_board.turn == chess.WHITE else -1
+
+        for node in self.layer_nodes[1]:
+            score = sign * self.scores[node]
+            if score > best_score:
+                possible_best_moves.clear()
+                possible_best_moves.append(self.get_move(node))
+                best_score = score
+            elif score == best_score:
+                possible_best_moves.append(self.get_move(node))
+        return possible_best_moves
+
+    def figure_move(self):
+        move = random_move(self.choose_best_scoring_move())
+        return move
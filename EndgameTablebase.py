@@ -0,0 +1,161 @@
+
+##
+# Syzygy endgame tablebases
+##
+import os
+from collections import OrderedDict
+
+import chess
+import chess.syzygy
+
+from TranspositionTable import zobrist_hash
+
+
+TABLEBASE_WIN = 50000  # above any material balance, a won endgame beats every other line
+DEFAULT_PROBE_CACHE = 65536  # positions whose probe results are kept
+
+
+class EndgameTablebase:
+    """
+    Probes a directory of Syzygy tables through chess.syzygy. Tables are only consulted for positions with few
+    enough pieces and no castling rights, and the results are kept in a bounded LRU cache keyed by zobrist hash since
+    the same endgame positions come up again and again in a search. WDL scores replace the material score of a
+    position, DTZ picks the move that converts the fastest.
+    """
+
+    def __init__(self, path: str, max_pieces=None, cache_size=DEFAULT_PROBE_CACHE):
+        """
+        :param path: directory with .rtbw and .rtbz files, several directories can be separated with os.pathsep
+        :param max_pieces: most pieces, kings included, of a probed position, defaults to the largest table found
+        :param cache_size: probe results kept in the LRU cache
+        """
+        self.path = path
+        self.tablebase = chess.syzygy.Tablebase()
+        for directory in path.split(os.pathsep):
+            self.tablebase.add_directory(directory)
+        if len(self.tablebase.wdl) == 0:
+            raise Exception("Invalid tablebase path, no Syzygy tables in: " + path)
+        largest = max(len(name) - 1 for name in self.tablebase.wdl)  # KQvK is 3 pieces
+        self.max_pieces = min(max_pieces, largest) if max_pieces is not None else largest
+        self.cache_size = cache_size
+        self.cache = OrderedDict()  # zobrist hash -> [wdl, dtz], dtz stays None until it is probed
+        self.probes = 0
+        self.cache_hits = 0
+        self.tablebase_hits = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        self.tablebase.close()
+
+    def can_probe(self, board: chess.Board):
+        return chess.popcount(board.occupied) <= self.max_pieces and not board.castling_rights
+
+    def lookup(self, board: chess.Board, dtz=False):
+        """
+        :param board: position to look up
+        :param dtz: True to make sure the entry has its dtz probed as well
+        :return: cache entry [wdl, dtz], wdl is None when no table covers the position
+        """
+        key = zobrist_hash(board)
+        entry = self.cache.get(key)
+        if entry is not None:
+            self.cache.move_to_end(key)
+            self.cache_hits += 1
+        else:
+            entry = [self.tablebase.get_wdl(board), None]
+            self.cache[key] = entry
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        if dtz and entry[0] is not None and entry[1] is None:
+            entry[1] = self.tablebase.get_dtz(board)
+        return entry
+
+    def probe_wdl(self, board: chess.Board):
+        """
+        :param board: position to probe
+        :return: 2 win, 1 win that the 50 move rule turns into a draw, 0 draw, -1 and -2 the same for losses, from the
+        point of view of the side to move. None when the position is not covered
+        """
+        if not self.can_probe(board):
+            return None
+        self.probes += 1
+        wdl = self.lookup(board)[0]
+        if wdl is not None:
+            self.tablebase_hits += 1
+        return wdl
+
+    def score(self, board: chess.Board):
+        """
+        scores a position from the tables, wins that the 50 move rule draws count as draws
+        :param board: position to score
+        :return: TABLEBASE_WIN, 0 or -TABLEBASE_WIN from the point of view of the side to move, None when the
+        position is not covered
+        """
+        wdl = self.probe_wdl(board)
+        if wdl is None:
+            return None
+        if wdl == 2:
+            return TABLEBASE_WIN
+        if wdl == -2:
+            return -TABLEBASE_WIN
+        return 0
+
+    def white_score(self, board: chess.Board):
+        """
+        score from white's point of view like score_chessboard
+        """
+        score = self.score(board)
+        if score is None or board.turn == chess.WHITE:
+            return score
+        return -score
+
+    def choose_moves(self, board: chess.Board):
+        """
+        picks the moves that keep the best result and reach it the fastest: when winning the smallest distance to
+        a capture or pawn move that keeps the win, when losing the largest
+        :param board: position to move in
+        :return: list of the best moves in uci notation, None when the position is not covered
+        """
+        if self.probe_wdl(board) is None:
+            return None
+        board = board.copy(stack=False)
+        ranked = list()
+        for move in board.legal_moves:
+            zeroing = board.is_zeroing(move)
+            board.push(move)
+            if board.is_checkmate():  # ranked above every other win
+                board.pop()
+                ranked.append(((3, 0), move.uci()))
+                continue
+            wdl, dtz = self.lookup(board, dtz=True)
+            board.pop()
+            if wdl is None or dtz is None:  # a table the move leads into is missing
+                return None
+            wdl = -wdl
+            if wdl > 0:  # win fastest, a zeroing move that keeps the win resets the count
+                rank = (wdl, -(0 if zeroing else abs(dtz)))
+            elif wdl < 0:  # lose slowest
+                rank = (wdl, 0 if zeroing else abs(dtz))
+            else:
+                rank = (0, 0)
+            ranked.append((rank, move.uci()))
+        best = max(rank for rank, _ in ranked)
+        return [move for rank, move in ranked if rank == best]
+
+    def reset_stats(self):
+        self.probes = 0
+        self.cache_hits = 0
+        self.tablebase_hits = 0
+
+    def get_stats(self):
+        return {
+            "tablebase_probes": self.probes,
+            "tablebase_hits": self.tablebase_hits,
+            "tablebase_cache_hits": self.cache_hits,
+            "tablebase_cache_size": len(self.cache),
+        }
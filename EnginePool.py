@@ -0,0 +1,185 @@
+
+##
+# Long lived UCI engine processes
+##
+import os
+import subprocess
+import threading
+
+import chess
+
+
+DEFAULT_ENGINE_PATH = "stockfish"  # looked up on the PATH unless STOCKFISH_PATH is set
+
+
+def default_engine_path():
+    return os.environ.get("STOCKFISH_PATH", DEFAULT_ENGINE_PATH)
+
+
+class UCIEngine:
+    """
+    Talks to one UCI engine process over its stdin/stdout
+    """
+
+    def __init__(self, path):
+        """
+        :param path: path to the engine binary, or a list of the command and its arguments
+        """
+        command = [path] if isinstance(path, str) else list(path)
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                        stderr=subprocess.DEVNULL, universal_newlines=True, bufsize=1)
+        self.options = dict()
+        self.send("uci")
+        self.wait_for("uciok")
+        self.is_ready()
+
+    def send(self, command: str):
+        self.process.stdin.write(command + "\n")
+        self.process.stdin.flush()
+
+    def wait_for(self, token: str):
+        """
+        reads engine output until a line starting with token arrives
+        :param token: first word of the awaited line
+        :return: the awaited line
+        """
+        while True:
+            line = self.process.stdout.readline()
+            if line == "":
+                raise Exception("UCI engine exited while waiting for " + token)
+            line = line.strip()
+            if line.split(" ", 1)[0] == token:
+                return line
+
+    def is_ready(self):
+        self.send("isready")
+        self.wait_for("readyok")
+
+    def set_option(self, name: str, value):
+        if isinstance(value, bool):
+            value = "true" if value else "false"
+        if self.options.get(name) == value:
+            return
+        self.send("setoption name " + name + " value " + str(value))
+        self.options[name] = value
+
+    def new_game(self):
+        self.send("ucinewgame")
+        self.is_ready()
+
+    def set_position(self, board: chess.Board):
+        """
+        sends the position of a board. Only the moves since the last capture or pawn move are sent, anything before
+        them can not repeat anymore, so the command stays short no matter how long the game gets
+        :param board: board to send
+        :return:
+        """
+        plies = min(board.halfmove_clock, len(board.move_stack))
+        start = board.copy()
+        for _ in range(plies):
+            start.pop()
+        command = "position fen " + start.fen()
+        if plies > 0:
+            command += " moves " + " ".join(move.uci() for move in board.move_stack[-plies:])
+        self.send(command)
+
+    def best_move(self, movetime: int):
+        """
+        :param movetime: time to think in milliseconds
+        :return: best move in uci notation, or None if the engine has no move
+        """
+        self.send("go movetime " + str(movetime))
+        parts = self.wait_for("bestmove").split()
+        if len(parts) < 2 or parts[1] in ("(none)", "0000"):
+            return None
+        return parts[1]
+
+    def quit(self):
+        if self.process.poll() is None:
+            try:
+                self.send("quit")
+                self.process.wait(timeout=5)
+            except (OSError, subprocess.TimeoutExpired):
+                self.process.kill()
+
+
+class EnginePool:
+    """
+    Keeps UCI engine processes alive between games. acquire hands out an idle engine (starting a new one if none is
+    idle), release gives it back for the next game. Safe to share between threads playing games in parallel.
+    """
+
+    def __init__(self, path=None, max_engines=None):
+        """
+        :param path: engine binary or command list, defaults to STOCKFISH_PATH or "stockfish" on the PATH
+        :param max_engines: optional cap on the number of running engines
+        """
+        self.path = path if path is not None else default_engine_path()
+        self.max_engines = max_engines
+        self.idle = list()
+        self.engine_count = 0
+        self.closed = False
+        self.condition = threading.Condition()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def acquire(self):
+        """
+        :return: a UCIEngine that belongs to the caller until it is released
+        """
+        with self.condition:
+            while len(self.idle) == 0 and self.max_engines is not None and self.engine_count >= self.max_engines:
+                self.condition.wait()
+            if len(self.idle) > 0:
+                return self.idle.pop()
+            self.engine_count += 1
+        try:
+            return UCIEngine(self.path)
+        except Exception:
+            with self.condition:
+                self.engine_count -= 1
+                self.condition.notify()
+            raise
+
+    def release(self, engine: UCIEngine):
+        with self.condition:
+            if not self.closed:
+                self.idle.append(engine)
+                self.condition.notify()
+                return
+            self.engine_count -= 1
+        engine.quit()
+
+    def close(self):
+        """
+        quits the idle engines, engines still handed out are quit when they are released afterwards
+        :return:
+        """
+        with self.condition:
+            self.closed = True
+            engines = list(self.idle)
+            self.idle.clear()
+            self.engine_count -= len(engines)
+        for engine in engines:
+            engine.quit()
+
+
+default_pools = dict()
+default_pools_lock = threading.Lock()
+
+
+def get_default_pool(path=None):
+    """
+    :param path: engine binary or command list
+    :return: the process wide EnginePool for that engine
+    """
+    path = path if path is not None else default_engine_path()
+    key = path if isinstance(path, str) else tuple(path)
+    with default_pools_lock:
+        if key not in default_pools:
+            default_pools[key] = EnginePool(path)
+        return default_pools[key]
@@ -0,0 +1,159 @@
+
+##
+# Persistent evaluation cache shared between processes
+##
+import mmap
+import os
+import struct
+import tempfile
+import zlib
+
+import chess
+
+from TranspositionTable import zobrist_hash
+
+
+MAGIC = b"CTEVAL01"
+HEADER = struct.Struct("<8sQ")  # magic, number of slots
+ENTRY = struct.Struct("<QdIhH")  # key check, score, version, depth, padding
+MASK_64 = 0xFFFFFFFFFFFFFFFF
+
+
+def cache_version(*settings):
+    """
+    :param settings: anything that changes the scores, e.g. the evaluation weights and the scoring style
+    :return: 32 bit version number stored with every entry, entries of other versions never hit
+    """
+    return zlib.crc32(repr(settings).encode())
+
+
+def entry_data(score: float, version: int, depth: int):
+    """
+    :return: 64 bit word mixed into the stored key so a torn entry does not verify
+    """
+    return struct.unpack("<Q", struct.pack("<d", score))[0] ^ (version << 24) ^ depth
+
+
+def create_cache_file(path: str, slots: int):
+    """
+    creates an empty cache file without other processes ever seeing it half written. The file is written under a
+    temporary name and then linked to its path, which fails instead of overwriting when another process was first
+    :param path: cache file
+    :param slots: number of slots
+    :return:
+    """
+    directory, name = os.path.split(os.path.abspath(path))
+    descriptor, temp_path = tempfile.mkstemp(prefix=name + ".", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(descriptor, "wb") as file:
+            file.write(HEADER.pack(MAGIC, slots))
+            file.truncate(HEADER.size + slots * ENTRY.size)
+        try:
+            os.link(temp_path, path)
+        except FileExistsError:
+            pass  # created by another process in the meantime, every process opens that one
+    finally:
+        os.remove(temp_path)
+
+
+class EvalCache:
+    """
+    Fixed size table of scores in a memory mapped file, keyed by zobrist hash, version and depth. It survives the
+    process, so positions scored in one bench run or game are not scored again in the next, and every worker process
+    that opens the same file shares it.
+
+    Every position has a single slot (hash modulo the slot count) and a store always overwrites it, so the table
+    holds the most recently stored position of every slot. Entries are written without locks; the key is stored
+    xor'ed with the score, version and depth, so an entry torn by two processes writing at once, or by a reader
+    racing a writer, fails to verify and counts as a miss instead of returning a wrong score.
+    """
+
+    def __init__(self, path: str, size_mb=64, version=0):
+        """
+        :param path: cache file, created with size_mb megabytes if it does not exist. Processes creating it at the
+        same time all end up with the same file
+        :param size_mb: size of a new cache file, an existing file keeps its size
+        :param version: see cache_version
+        """
+        if size_mb <= 0:
+            raise Exception("Invalid evaluation cache size: " + str(size_mb))
+        self.path = path
+        self.version = version
+        if not os.path.exists(path):
+            create_cache_file(path, max(1, int(size_mb * 1024 * 1024) // ENTRY.size))
+
+        self.file = open(path, "r+b")
+        self.mmap = mmap.mmap(self.file.fileno(), 0)
+        magic, self.slots = HEADER.unpack_from(self.mmap, 0)
+        if magic != MAGIC or len(self.mmap) != HEADER.size + self.slots * ENTRY.size:
+            self.close()
+            raise Exception("Invalid evaluation cache file: " + path)
+
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        if self.mmap is not None:
+            self.mmap.flush()
+            self.mmap.close()
+            self.mmap = None
+        self.file.close()
+
+    def offset(self, key: int):
+        return HEADER.size + (key % self.slots) * ENTRY.size
+
+    def probe(self, key: int, depth: int):
+        """
+        :param key: zobrist hash of the position
+        :param depth: plies the score was searched to, 0 for a static evaluation
+        :return: the stored score, or None
+        """
+        check, score, version, stored_depth, _ = ENTRY.unpack_from(self.mmap, self.offset(key))
+        if version == self.version and stored_depth == depth and check ^ entry_data(score, version, depth) == key:
+            self.hits += 1
+            return score
+        self.misses += 1
+        return None
+
+    def store(self, key: int, depth: int, score: float):
+        """
+        overwrites the slot of the position
+        :param key: zobrist hash of the position
+        :param depth: plies the score was searched to, 0 for a static evaluation
+        :param score: score to store
+        :return:
+        """
+        check = key ^ entry_data(score, self.version, depth)
+        ENTRY.pack_into(self.mmap, self.offset(key), check & MASK_64, score, self.version, depth, 0)
+        self.stores += 1
+
+    def probe_board(self, board: chess.Board, depth: int):
+        return self.probe(zobrist_hash(board), depth)
+
+    def store_board(self, board: chess.Board, depth: int, score: float):
+        self.store(zobrist_hash(board), depth, score)
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+
+    def get_hit_rate(self):
+        if self.hits + self.misses == 0:
+            return 0.0
+        return self.hits / (self.hits + self.misses)
+
+    def get_stats(self):
+        return {
+            "cache_hits": self.hits,
+            "cache_misses": self.misses,
+            "cache_stores": self.stores,
+            "cache_hit_rate": round(self.get_hit_rate(), 4),
+        }
@@ -0,0 +1,86 @@
+
+##
+# Material evaluation
+##
+import chess
+
+
+def material_score(board: chess.Board, k_val=9000, q_val=1000, r_val=550, b_val=350, n_val=350, p_val=100):
+    """
+    counts the material on the board from the piece bitboards, white pieces add to the score and black pieces
+    subtract from it
+    :param board: board to score
+    :return: score
+    """
+    white = board.occupied_co[chess.WHITE]
+    black = board.occupied_co[chess.BLACK]
+    score = 0
+    for mask, value in ((board.pawns, p_val), (board.knights, n_val), (board.bishops, b_val),
+                        (board.rooks, r_val), (board.queens, q_val), (board.kings, k_val)):
+        score += value * (chess.popcount(mask & white) - chess.popcount(mask & black))
+    return score
+
+
+class MaterialEvaluator:
+    """
+    Keeps the material balance of a board up to date while moves are pushed and popped, only captures and
+    promotions change the score. Scores match score_chessboard for the same weights.
+    """
+
+    def __init__(self, k_val=9000, q_val=1000, r_val=550, b_val=350, n_val=350, p_val=100):
+        self.weights = (k_val, q_val, r_val, b_val, n_val, p_val)
+        self.values = [0, p_val, n_val, b_val, r_val, q_val, k_val]  # indexed by chess piece type
+        self.score = 0
+        self.history = list()
+
+    def evaluate(self, board: chess.Board):
+        """
+        full recompute of the material balance
+        :param board: board to score
+        :return: score from white's point of view
+        """
+        return material_score(board, *self.weights)
+
+    def set_board(self, board: chess.Board):
+        self.score = self.evaluate(board)
+        self.history.clear()
+
+    def get_score(self):
+        return self.score
+
+    def move_delta(self, board: chess.Board, move: chess.Move):
+        """
+        change in white's material caused by a move, must be called before the move is pushed
+        :param board: board the move will be played on
+        :param move: move to be played
+        :return: score delta
+        """
+        delta = 0
+        captured = board.piece_at(move.to_square)
+        if captured is not None and captured.color != board.turn:
+            delta += self.values[captured.piece_type]
+        elif move.to_square == board.ep_square and board.piece_type_at(move.from_square) == chess.PAWN:
+            delta += self.values[chess.PAWN]
+        if move.promotion:
+            delta += self.values[move.promotion] - self.values[chess.PAWN]
+        if board.turn == chess.WHITE:
+            return delta
+        return -delta
+
+    def update(self, board: chess.Board, move: chess.Move):
+        """
+        updates the score for a move that is about to be pushed, for callers that push the move themselves
+        """
+        self.history.append(self.score)
+        self.score += self.move_delta(board, move)
+
+    def undo(self):
+        self.score = self.history.pop()
+
+    def push(self, board: chess.Board, move: chess.Move):
+        self.update(board, move)
+        board.push(move)
+
+    def pop(self, board: chess.Board):
+        board.pop()
+        self.undo()
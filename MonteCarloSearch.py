@@ -0,0 +1,242 @@
+
+##
+# Monte Carlo tree search
+##
+import math
+import random
+import time
+
+import chess
+
+from Evaluator import material_score
+from Opponents import RandomPlayer
+
+
+ROLLOUT_STYLES = ["random", "greedy"]
+DEFAULT_ROLLOUT_PLIES = {"random": 40, "greedy": 8}  # a greedy ply scores every move, so greedy playouts are shorter
+DEFAULT_PLAYOUTS = 400
+DEFAULT_EXPLORATION = 1.4
+ROLLOUT_SCALE = 400  # material difference that counts as ten to one odds at the end of a cut off playout
+
+
+def material_result(board: chess.Board):
+    """
+    result of a playout cut off before the game ended, from the material left on the board
+    :return: expected score of white between 0 and 1
+    """
+    return 1 / (1 + 10 ** (-material_score(board) / ROLLOUT_SCALE))
+
+
+def game_result(board: chess.Board):
+    """
+    :return: 1 if white won, 0 if black won, 0.5 for a draw
+    """
+    outcome = board.outcome()
+    if outcome is None or outcome.winner is None:
+        return 0.5
+    return 1.0 if outcome.winner == chess.WHITE else 0.0
+
+
+def rollout(board: chess.Board, rollout_style: str, max_plies: int):
+    """
+    plays a game on from the board, changing it
+    :param board: position to play from
+    :param rollout_style: "random" plays like RandomPlayer, "greedy" like the "greedy" search style
+    :param max_plies: plies after which the playout is scored from the material left
+    :return: expected score of white between 0 and 1
+    """
+    if rollout_style == "random":
+        player = RandomPlayer(board)
+        for _ in range(max_plies):
+            if board.is_game_over():
+                return game_result(board)
+            player.figure_move()
+    else:
+        from ChessThinker import ChessThinker  # imported here, ChessThinker imports this module
+        thinker = ChessThinker(board)
+        for _ in range(max_plies):
+            if board.is_game_over():
+                return game_result(board)
+            board.push(thinker.best_apparent_move(list(board.legal_moves)))
+    if board.is_game_over():
+        return game_result(board)
+    return material_result(board)
+
+
+def run_rollouts(fens: list, seeds: list, rollout_style: str, max_plies: int):
+    """
+    worker task, plays one playout from each position
+    :param fens: positions to play from
+    :param seeds: seed of every playout
+    :return: list of the expected scores of white
+    """
+    results = list()
+    for fen, seed in zip(fens, seeds):
+        random.seed(seed)
+        results.append(rollout(chess.Board(fen), rollout_style, max_plies))
+    return results
+
+
+class MCTSNode:
+    __slots__ = ["move", "parent", "children", "untried", "visits", "value", "color", "terminal"]
+
+    def __init__(self, board: chess.Board, move=None, parent=None):
+        """
+        :param board: board with the node's move already made
+        :param move: chess.Move leading to the node, None at the root
+        :param parent: MCTSNode or None at the root
+        """
+        self.move = move
+        self.parent = parent
+        self.children = list()
+        self.untried = list(board.legal_moves)
+        random.shuffle(self.untried)
+        self.visits = 0
+        self.value = 0.0  # summed results for the side that made the move leading here
+        self.color = not board.turn
+        self.terminal = len(self.untried) == 0
+
+    def select_child(self, exploration: float):
+        """
+        :return: child with the highest upper confidence bound (UCT)
+        """
+        log_visits = math.log(self.visits)
+        return max(self.children, key=lambda child: child.value / child.visits +
+                   exploration * math.sqrt(log_visits / child.visits))
+
+
+class MonteCarloSearch:
+    """
+    Monte Carlo tree search with UCT selection. Instead of searching every move to a fixed depth it grows the tree
+    towards the moves whose playouts score best, so the cost grows with the number of playouts and not exponentially
+    with the depth. Playouts are collected in batches, a visit is counted on the selected path straight away (a
+    virtual loss) so one batch spreads over different leaves, and a batch is played out across a process pool when
+    one is given.
+    """
+
+    def __init__(self, board: chess.Board, playouts=DEFAULT_PLAYOUTS, time_ms=None, rollout_style="random",
+                 rollout_plies=None, exploration=DEFAULT_EXPLORATION, executor=None, batch_size=None, workers=1):
+        """
+        :param board: board to search, a copy is searched
+        :param playouts: most playouts to run, None to only stop on the time budget
+        :param time_ms: optional time budget in milliseconds, the batch running when it ends is finished
+        :param rollout_style: see ROLLOUT_STYLES
+        :param rollout_plies: plies of a playout before it is scored from the material, defaults to
+        DEFAULT_ROLLOUT_PLIES
+        :param exploration: UCT exploration constant
+        :param executor: optional concurrent.futures executor to play the batches out in, None plays them here
+        :param batch_size: playouts per batch, defaults to 8 per worker
+        :param workers: number of workers of the executor, a batch is split into one chunk per worker
+        """
+        if rollout_style not in ROLLOUT_STYLES:
+            raise Exception("Invalid rollout style: " + str(rollout_style))
+        if playouts is None and time_ms is None:
+            raise Exception("Invalid search budget: a playout or time budget is needed")
+        self.board = board.copy()
+        self.playouts = playouts
+        self.time_ms = time_ms
+        self.rollout_style = rollout_style
+        self.rollout_plies = rollout_plies if rollout_plies is not None else DEFAULT_ROLLOUT_PLIES[rollout_style]
+        self.exploration = exploration
+        self.executor = executor
+        self.workers = max(1, workers)
+        self.batch_size = batch_size if batch_size is not None else 8 * self.workers
+        self.root = None
+        self.playouts_run = 0
+        self.nodes = 0
+
+    def get_node_count(self):
+        return self.nodes
+
+    def get_playout_count(self):
+        return self.playouts_run
+
+    def select(self):
+        """
+        walks down the tree by UCT and expands one untried move, counting a visit on every node of the path
+        :return: (new or terminal node, board of the node)
+        """
+        node = self.root
+        board = self.board.copy(stack=False)
+        node.visits += 1
+        while len(node.untried) == 0 and not node.terminal:
+            node = node.select_child(self.exploration)
+            board.push(node.move)
+            node.visits += 1
+        if len(node.untried) > 0:
+            move = node.untried.pop()
+            board.push(move)
+            child = MCTSNode(board, move, node)
+            node.children.append(child)
+            self.nodes += 1
+            node = child
+            node.visits += 1
+        return node, board
+
+    def backup(self, node, result: float):
+        """
+        adds a playout result to every node of the path, the visits were counted by select
+        :param node: node the playout started from
+        :param result: expected score of white
+        """
+        while node is not None:
+            node.value += result if node.color == chess.WHITE else 1 - result
+            node = node.parent
+
+    def play_batch(self, size: int):
+        """
+        selects size leaves and plays one playout from each of them
+        :param size: playouts in the batch
+        """
+        leaves = list()
+        fens = list()
+        for _ in range(size):
+            node, board = self.select()
+            if node.terminal or board.is_game_over():
+                self.backup(node, game_result(board))
+            else:
+                leaves.append(node)
+                fens.append(board.fen())
+        seeds = [random.getrandbits(32) for _ in fens]
+
+        if self.executor is None or len(fens) < 2:
+            results = run_rollouts(fens, seeds, self.rollout_style, self.rollout_plies)
+        else:
+            chunk = math.ceil(len(fens) / self.workers)
+            futures = [self.executor.submit(run_rollouts, fens[start:start + chunk], seeds[start:start + chunk],
+                                            self.rollout_style, self.rollout_plies)
+                       for start in range(0, len(fens), chunk)]
+            results = [result for future in futures for result in future.result()]
+        for node, result in zip(leaves, results):
+            self.backup(node, result)
+        self.playouts_run += size
+
+    def choose_best_scoring_move(self):
+        """
+        runs batches until the playout or time budget is used up
+        :return: list of the most visited root moves in uci notation
+        """
+        self.root = MCTSNode(self.board)
+        self.nodes = 1
+        self.playouts_run = 0
+        if self.root.terminal:
+            return list()
+        deadline = time.time() + self.time_ms / 1000 if self.time_ms is not None else None
+        while self.playouts is None or self.playouts_run < self.playouts:
+            size = self.batch_size
+            if self.playouts is not None:
+                size = min(size, self.playouts - self.playouts_run)
+            self.play_batch(size)
+            if deadline is not None and time.time() > deadline:
+                break
+        most_visits = max(child.visits for child in self.root.children)
+        return [child.move.uci() for child in self.root.children if child.visits == most_visits]
+
+    def figure_move(self):
+        """
+        :return: one of the most visited root moves in uci notation, None when there is no legal move
+        """
+        moves = self.choose_best_scoring_move()
+        if len(moves) == 0:
+            return None
+        return moves[random.randint(0, len(moves) - 1)]
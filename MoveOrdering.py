@@ -0,0 +1,112 @@
+
+##
+# Move ordering for the alpha-beta search
+##
+import chess
+
+
+MAX_PLY = 128
+# piece values used to rank captures, indexed by chess piece type
+ORDERING_VALUES = [0, 1, 3, 3, 5, 9, 20]
+
+
+def capture_priority(board: chess.Board, move: chess.Move):
+    """
+    :return: sort key of a promotion or a capture by most valuable victim / least valuable attacker, None for any
+    other move
+    """
+    if move.promotion:
+        return 4, move.promotion
+    victim = board.piece_type_at(move.to_square)
+    if victim is not None or (move.to_square == board.ep_square and
+                              board.piece_type_at(move.from_square) == chess.PAWN):
+        attacker = board.piece_type_at(move.from_square)
+        victim_value = ORDERING_VALUES[victim] if victim is not None else ORDERING_VALUES[chess.PAWN]
+        return 3, 10 * victim_value - ORDERING_VALUES[attacker]
+    return None
+
+
+def order_captures(board: chess.Board, moves: list):
+    """
+    sorts the moves of a quiescence node in place, promotions and captures first and any other move after them
+    :param board: board the moves belong to
+    :param moves: list of chess.Move
+    :return:
+    """
+    moves.sort(key=lambda move: capture_priority(board, move) or (0, 0), reverse=True)
+
+
+class MoveOrderer:
+    """
+    Sorts moves so the alpha-beta search finds cutoffs early: promotions first, then captures by most valuable
+    victim / least valuable attacker, then the killer moves of the ply, then quiet moves by their history score.
+    Killers and history are kept for the search of one move and cleared by new_search.
+    """
+
+    def __init__(self):
+        self.killers = [[None, None] for _ in range(MAX_PLY)]
+        self.history = [[[0] * 64 for _ in range(64)] for _ in range(2)]  # [color][from square][to square]
+
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+
+    def new_search(self):
+        self.killers = [[None, None] for _ in range(MAX_PLY)]
+        self.history = [[[0] * 64 for _ in range(64)] for _ in range(2)]
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+
+    def get_first_move_cutoff_rate(self):
+        """
+        :return: share of cutoffs caused by the first move searched, 1.0 means the ordering was perfect
+        """
+        if self.cutoffs == 0:
+            return 0.0
+        return self.first_move_cutoffs / self.cutoffs
+
+    def get_stats(self):
+        return {
+            "cutoffs": self.cutoffs,
+            "first_move_cutoff_rate": round(self.get_first_move_cutoff_rate(), 4),
+        }
+
+    def move_priority(self, board: chess.Board, move: chess.Move, ply: int):
+        """
+        :return: sort key, higher keys are searched first
+        """
+        priority = capture_priority(board, move)
+        if priority is not None:
+            return priority
+        if ply < MAX_PLY and move in self.killers[ply]:
+            return 2, 1 if move == self.killers[ply][0] else 0
+        return 1, self.history[board.turn][move.from_square][move.to_square]
+
+    def order(self, board: chess.Board, moves: list, ply: int):
+        """
+        sorts the moves of a node in place
+        :param board: board the moves belong to
+        :param moves: list of chess.Move
+        :param ply: distance from the root
+        :return:
+        """
+        moves.sort(key=lambda move: self.move_priority(board, move, ply), reverse=True)
+
+    def record_cutoff(self, board: chess.Board, move: chess.Move, ply: int, depth: int, move_number: int):
+        """
+        remembers a move that caused a beta cutoff, must be called while the move is not pushed
+        :param board: board the move was played on
+        :param move: move that caused the cutoff
+        :param ply: distance from the root
+        :param depth: plies that were left to search
+        :param move_number: position of the move in the searched order, 0 for the first move
+        :return:
+        """
+        self.cutoffs += 1
+        if move_number == 0:
+            self.first_move_cutoffs += 1
+        if board.is_capture(move) or move.promotion:
+            return
+        if ply < MAX_PLY and self.killers[ply][0] != move:
+            self.killers[ply][1] = self.killers[ply][0]
+            self.killers[ply][0] = move
+        self.history[board.turn][move.from_square][move.to_square] += depth * depth
@@ -0,0 +1,130 @@
+
+##
+# Polyglot opening books
+##
+import random
+from collections import defaultdict
+
+import chess
+import chess.polyglot
+
+
+MAX_BOOK_WEIGHT = 0xFFFF  # polyglot weights are 16 bit
+
+
+class OpeningBook:
+    """
+    Reads a Polyglot .bin book. The file is memory mapped and its entries are sorted by zobrist key, so opening it
+    costs nothing and a lookup is a binary search. Moves are picked at random in proportion to their weight.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.reader = chess.polyglot.open_reader(path)
+        self.hits = 0
+        self.misses = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __len__(self):
+        return len(self.reader)
+
+    def close(self):
+        self.reader.close()
+
+    def find_moves(self, board: chess.Board):
+        """
+        :param board: position to look up
+        :return: list of (chess.Move, weight) the book has for the position
+        """
+        return [(entry.move, entry.weight) for entry in self.reader.find_all(board)]
+
+    def choose_move(self, board: chess.Board):
+        """
+        picks a book move, moves with a higher weight are picked more often
+        :param board: position to look up
+        :return: move in uci notation, or None when the position is not in the book
+        """
+        moves = [(move, weight) for move, weight in self.find_moves(board) if weight > 0]
+        if len(moves) == 0:
+            self.misses += 1
+            return None
+        self.hits += 1
+        pick = random.randint(1, sum(weight for _, weight in moves))
+        for move, weight in moves:
+            pick -= weight
+            if pick <= 0:
+                return move.uci()
+
+    def get_stats(self):
+        total = self.hits + self.misses
+        return {
+            "book_hits": self.hits,
+            "book_misses": self.misses,
+            "book_hit_rate": round(self.hits / total, 3) if total > 0 else 0.0,
+        }
+
+
+def encode_book_move(board: chess.Board, move: chess.Move):
+    """
+    :param board: board the move is played on
+    :param move: move to encode
+    :return: 16 bit polyglot move, castling is written as the king taking its own rook
+    """
+    to_square = move.to_square
+    if board.is_castling(move):
+        to_square = chess.square(7 if board.is_kingside_castling(move) else 0, chess.square_rank(move.from_square))
+    promotion = move.promotion - 1 if move.promotion else 0
+    return chess.square_file(to_square) | chess.square_rank(to_square) << 3 | \
+        chess.square_file(move.from_square) << 6 | chess.square_rank(move.from_square) << 9 | promotion << 12
+
+
+class BookBuilder:
+    """
+    Counts the moves played in a set of games and writes them as a Polyglot book, the weight of a move is the
+    number of times it was played in its position
+    """
+
+    def __init__(self, max_plies=16):
+        """
+        :param max_plies: only the first max_plies of every game go into the book
+        """
+        self.max_plies = max_plies
+        self.counts = defaultdict(int)  # (zobrist key, polyglot move) -> times played
+
+    def add_move(self, board: chess.Board, move: chess.Move):
+        """
+        :param board: board before the move
+        :param move: move played
+        :return:
+        """
+        self.counts[(chess.polyglot.zobrist_hash(board), encode_book_move(board, move))] += 1
+
+    def add_game(self, moves: list, start_fen=chess.STARTING_FEN):
+        """
+        :param moves: moves of a game as chess.Move or uci strings
+        :param start_fen: position the game started from
+        :return:
+        """
+        board = chess.Board(start_fen)
+        for move in moves[:self.max_plies]:
+            move = chess.Move.from_uci(move) if isinstance(move, str) else move
+            self.add_move(board, move)
+            board.push(move)
+
+    def write(self, path: str):
+        """
+        writes the book sorted by key, the order the memory mapped lookup relies on
+        :param path: .bin file to write
+        :return: number of entries written
+        """
+        entries = sorted(self.counts.items())
+        with open(path, "wb") as file:
+            for (key, raw_move), count in entries:
+                file.write(chess.polyglot.ENTRY_STRUCT.pack(key, raw_move, min(count, MAX_BOOK_WEIGHT), 0))
+        return len(entries)
+
@@ -8,7 +8,6 @@
 
 import chess
 import random
-from stockfish import Stockfish
 
 
 class RandomPlayer:
@@ -31,40 +30,63 @@ class RandomPlayer:
 
 class FishPlayer:
     """
-    Manages stockfish's moves
+    Manages stockfish's moves. The engine process comes from an EnginePool and is reused from game to game, any UCI
+    engine works in place of stockfish.
     """
 
-    def __init__(self, chessboard: chess.Board):
+    def __init__(self, chessboard: chess.Board, path_to_exe=None, pool=None):
+        """
+        :param chessboard: board shared with the BoardManager
+        :param path_to_exe: engine binary or command list, defaults to STOCKFISH_PATH or "stockfish" on the PATH
+        :param pool: EnginePool to draw the engine from, defaults to the process wide pool of the engine
+        """
         self.moves_made = list()
-        self.path_to_exe = "C:\\Users\\allenm\\Desktop\\21-22 Year\\Fall\\Chessler\\stockfish_14_win_x64_avx2\\" \
-                           "stockfish_14_x64_avx2.exe"
-        self.fish = Stockfish(path=self.path_to_exe)
+        if pool is None:
+            from EnginePool import get_default_pool  # subprocess and the engine pool are only loaded for stockfish
+            pool = get_default_pool(path_to_exe)
+        self.pool = pool
+        self.path_to_exe = self.pool.path
+        self.fish = self.pool.acquire()
+        self.fish.new_game()
+        self.fish.set_option("UCI_LimitStrength", False)  # a pooled engine keeps the strength limit of its last player
+        self.elo = None
         self.board = chessboard
 
     def get_current_fen(self):
-        return self.fish.get_fen_position()
+        return self.board.fen()
 
     def set_elo(self, elo: int):
-        self.fish.set_elo_rating(elo)
+        self.elo = elo
+        self.fish.set_option("UCI_LimitStrength", True)
+        self.fish.set_option("UCI_Elo", elo)
 
     def show_board(self):
         print(self.board)
 
     def reset_board(self):
-        self.fish = Stockfish(path=self.path_to_exe)  # reset the stockfish object
-        self.fish.set_fen_position("rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1")  # set up board using fen
+        self.fish.new_game()  # reuse the engine process, only its game state is reset
         self.moves_made.clear()
 
+    def close(self):
+        """
+        hands the engine back to the pool
+        :return:
+        """
+        if self.fish is not None:
+            self.pool.release(self.fish)
+            self.fish = None
+
     def move(self, move: str):
         # check first to see if the move is a valid move
-        if not self.fish.is_move_correct(move_value=move):
+        if chess.Move.from_uci(move) not in self.board.legal_moves:
             raise Exception("Invalid move:", move)
         else:
             self.moves_made.append(move)  # append move ot the list of made moves
-            self.fish.set_position(self.moves_made)  # apply move to Stockfish
             self.board.push_uci(move)  # apply move to the chess.Board
 
     def figure_move(self, timeout=1000):
-        # FIXME why is move none on second iteration?
-        move = self.fish.get_best_move_time(timeout)  # get the best move possible in timeout ms
+        self.fish.set_position(self.board)  # the engine only hears about the position when it has to move
+        move = self.fish.best_move(timeout)  # get the best move possible in timeout ms
+        if move is None:
+            raise Exception("Engine found no move in position: " + self.board.fen())
         self.move(move)  # apply the move
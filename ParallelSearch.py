@@ -0,0 +1,161 @@
+
+##
+# Root parallel search across a process pool
+##
+import multiprocessing
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import chess
+
+from MoveOrdering import MoveOrderer
+from SearchEngine import INFINITY, AlphaBetaSearch
+
+
+shared_best = None  # best root score found so far, shared by the workers of a pool
+
+
+def init_worker(best_value):
+    global shared_best
+    shared_best = best_value
+
+
+def search_root_move(fen: str, move: str, depth: int, share_bounds: bool, quiescence=False,
+                     quiescence_checks=False):
+    """
+    worker task, searches the subtree below one root move
+    :param fen: fen of the root board
+    :param move: root move in uci notation
+    :param depth: depth of the whole search, counting the root move
+    :param share_bounds: True to start from the best root score other workers have found
+    :param quiescence: True to extend the leaves with a capture only search
+    :param quiescence_checks: True to also search checks in the quiescence search
+    :return: (move, score from the root side's point of view, nodes searched, quiescence nodes searched)
+    """
+    board = chess.Board(fen)
+    board.push_uci(move)
+    search = AlphaBetaSearch(board, max_depth=depth - 1, orderer=MoveOrderer(), quiescence=quiescence,
+                             quiescence_checks=quiescence_checks)
+
+    alpha = -INFINITY
+    if share_bounds:
+        alpha = shared_best.value
+    # a window opened by one below the best score keeps ties exact, just like the serial root search
+    score = -search.search(-INFINITY, -(alpha - 1))
+
+    if share_bounds:
+        with shared_best.get_lock():
+            if score > shared_best.value:
+                shared_best.value = score
+    return move, score, search.get_node_count() + 1, search.get_qnode_count()
+
+
+def random_move(moves: list):
+    """
+    generates a random move from the legal possible moves
+    ":param moves: list of valid moves for a given game state
+    :return: move
+    """
+    idx = random.randint(0, len(moves) - 1)
+    return moves[idx]
+
+
+class ParallelRootSearch:
+    """
+    Splits the root moves (the first layer of the tree) across a pool of worker processes. Every worker gets the
+    root fen and one move and searches that subtree with alpha-beta. With share_bounds the workers publish the best
+    root score through shared memory so later root moves are searched with a tighter window. Returns the same moves
+    as the serial "minimax" search.
+    """
+
+    def __init__(self, workers=None, share_bounds=True, quiescence=False, quiescence_checks=False):
+        self.workers = workers if workers is not None else multiprocessing.cpu_count()
+        self.share_bounds = share_bounds
+        self.quiescence = quiescence
+        self.quiescence_checks = quiescence_checks
+        self.best_value = multiprocessing.Value("q", -INFINITY)
+        self.pool = None
+
+        self.nodes = 0
+        self.qnodes = 0
+        self.elapsed = 0.0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.shutdown()
+
+    def get_pool(self):
+        if self.pool is None:
+            self.pool = ProcessPoolExecutor(max_workers=self.workers, initializer=init_worker,
+                                            initargs=(self.best_value,))
+        return self.pool
+
+    def shutdown(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+    def choose_best_scoring_move(self, board: chess.Board, depth: int):
+        """
+        :param board: board to search
+        :param depth: plies to search
+        :return: list of the best moves in uci notation
+        """
+        start = time.time()
+        moves = list(board.legal_moves)
+        MoveOrderer().order(board, moves, 0)  # likely best moves first so the shared bound tightens early
+        with self.best_value.get_lock():
+            self.best_value.value = -INFINITY
+
+        pool = self.get_pool()
+        fen = board.fen()
+        futures = [pool.submit(search_root_move, fen, move.uci(), depth, self.share_bounds, self.quiescence,
+                               self.quiescence_checks) for move in moves]
+
+        best_score = -INFINITY
+        possible_best_moves = list()
+        self.nodes = 1
+        self.qnodes = 0
+        for future in futures:
+            move, score, nodes, qnodes = future.result()
+            self.nodes += nodes
+            self.qnodes += qnodes
+            if score > best_score:
+                possible_best_moves.clear()
+                possible_best_moves.append(move)
+                best_score = score
+            elif score == best_score:
+                possible_best_moves.append(move)
+        self.elapsed = time.time() - start
+        return possible_best_moves
+
+    def figure_move(self, board: chess.Board, depth: int):
+        move = random_move(self.choose_best_scoring_move(board, depth))
+        return move
+
+
+def measure_speedup(board: chess.Board, depth: int, workers: int, share_bounds=True):
+    """
+    times the same root parallel search with one worker and with the given number of workers
+    :return: dict with both runtimes and the speedup
+    """
+    results = dict()
+    for count in (1, workers):
+        with ParallelRootSearch(workers=count, share_bounds=share_bounds) as search:
+            search.get_pool().submit(time.sleep, 0).result()  # start the pool outside of the timing
+            best_moves = search.choose_best_scoring_move(board, depth)
+            results[count] = (search.elapsed, sorted(best_moves), search.nodes)
+    serial_time = results[1][0]
+    parallel_time = results[workers][0]
+    return {
+        "workers": workers,
+        "serial_time": round(serial_time, 3),
+        "parallel_time": round(parallel_time, 3),
+        "speedup": round(serial_time / parallel_time, 2) if parallel_time > 0 else 0.0,
+        "same_moves": results[1][1] == results[workers][1],
+        "serial_nodes": results[1][2],
+        "parallel_nodes": results[workers][2],
+    }
@@ -0,0 +1,113 @@
+
+##
+# Searching on the opponent's time
+##
+import threading
+
+import chess
+
+
+class Ponderer:
+    """
+    Searches the positions after the opponent's likely replies in a background thread while the opponent thinks.
+    Results are kept per position, when the opponent plays one of the pondered replies its result is used instead of
+    searching again. The search function gets a threading.Event and has to return soon after the event is set, so
+    pondering can always be cancelled when the opponent plays something else.
+    """
+
+    def __init__(self):
+        self.thread = None
+        self.stop_event = threading.Event()
+        self.condition = threading.Condition()
+        self.results = dict()
+        self.current = None  # position the thread is searching right now
+        self.hits = 0
+        self.misses = 0
+
+    def start(self, board: chess.Board, replies: list, search_function):
+        """
+        starts pondering, any pondering still running is stopped first
+        :param board: board after our move, the positions are copied before the thread starts
+        :param replies: list of chess.Move the opponent may play, searched in order
+        :param search_function: function(board, stop_event) returning the result for a board, or None if it has none
+        :return:
+        """
+        self.stop()
+        self.results = dict()
+        self.stop_event = threading.Event()
+        boards = list()
+        for reply in replies:
+            next_board = board.copy()
+            next_board.push(reply)
+            boards.append(next_board)
+        self.thread = threading.Thread(target=self.run, args=(boards, search_function, self.stop_event), daemon=True)
+        self.thread.start()
+
+    def run(self, boards: list, search_function, stop_event: threading.Event):
+        for board in boards:
+            key = board.fen()
+            with self.condition:
+                if stop_event.is_set():
+                    break
+                self.current = key
+            result = None
+            try:
+                result = search_function(board, stop_event)
+            finally:
+                with self.condition:
+                    if result is not None:
+                        self.results[key] = result
+                    self.current = None
+                    self.condition.notify_all()
+
+    def is_pondering(self):
+        return self.thread is not None
+
+    def stop(self):
+        """
+        cancels pondering and waits for the thread to return
+        :return:
+        """
+        if self.thread is not None:
+            self.stop_event.set()
+            self.thread.join()
+            self.thread = None
+
+    def finish(self, board: chess.Board, timeout=None):
+        """
+        ends pondering once the opponent has moved
+        :param board: board after the opponent's reply
+        :param timeout: seconds to let a search of this position that is still running go on, None to wait until it
+        finishes
+        :return: the result for the board, or None when the reply was not pondered
+        """
+        if self.thread is None:
+            return None
+        key = board.fen()
+        with self.condition:
+            if key not in self.results and self.current == key:  # ponder hit while the search is still running
+                self.condition.wait_for(lambda: self.current != key, timeout=timeout)
+        self.stop()
+        result = self.results.get(key)
+        self.results = dict()
+        if result is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return result
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+
+    def get_hit_rate(self):
+        if self.hits + self.misses == 0:
+            return 0.0
+        return self.hits / (self.hits + self.misses)
+
+    def get_stats(self):
+        return {
+            "ponder_hits": self.hits,
+            "ponder_misses": self.misses,
+            "ponder_hit_rate": round(self.get_hit_rate(), 3),
+        }
@@ -0,0 +1,494 @@
+
+##
+# Native board representation
+##
+import chess
+
+from Evaluator import MaterialEvaluator
+
+
+PIECE_SYMBOLS = "PNBRQKpnbrqk"  # index of a piece in Position.pieces, white pieces first
+NO_PIECE = -1
+NO_SQUARE = -1
+CASTLE_WHITE_KING, CASTLE_WHITE_QUEEN, CASTLE_BLACK_KING, CASTLE_BLACK_QUEEN = 1, 2, 4, 8
+CASTLING_SYMBOLS = [(CASTLE_WHITE_KING, "K"), (CASTLE_WHITE_QUEEN, "Q"), (CASTLE_BLACK_KING, "k"),
+                    (CASTLE_BLACK_QUEEN, "q")]
+CASTLING_SQUARES = [(CASTLE_WHITE_KING, chess.E1, chess.H1), (CASTLE_WHITE_QUEEN, chess.E1, chess.A1),
+                    (CASTLE_BLACK_KING, chess.E8, chess.H8), (CASTLE_BLACK_QUEEN, chess.E8, chess.A8)]
+
+# castling rights kept after a move from or to a square, moving the king or a rook or capturing a rook loses them
+CASTLING_MASKS = [15] * 64
+for right, king_square, rook_square in CASTLING_SQUARES:
+    CASTLING_MASKS[king_square] &= ~right
+    CASTLING_MASKS[rook_square] &= ~right
+
+PROMOTION_TYPES = [chess.QUEEN, chess.ROOK, chess.BISHOP, chess.KNIGHT]
+
+
+def piece_index(piece_type: int, color: bool):
+    """
+    :return: index of the piece in Position.pieces
+    """
+    return piece_type - 1 if color == chess.WHITE else piece_type + 5
+
+
+def encode_move(from_square: int, to_square: int, promotion=0):
+    """
+    packs a move into an int, bits 0-5 are the from square, bits 6-11 the to square and the rest the promotion
+    piece type
+    """
+    return from_square | to_square << 6 | promotion << 12
+
+
+def move_to_chess(move: int):
+    """
+    :param move: move from Position.legal_moves
+    :return: the same move as a chess.Move
+    """
+    return chess.Move(move & 63, move >> 6 & 63, move >> 12 or None)
+
+
+def move_from_chess(move: chess.Move):
+    return encode_move(move.from_square, move.to_square, move.promotion or 0)
+
+
+def move_to_uci(move: int):
+    return move_to_chess(move).uci()
+
+
+def bishop_attacks(square: int, occupied: int):
+    return chess.BB_DIAG_ATTACKS[square][chess.BB_DIAG_MASKS[square] & occupied]
+
+
+def rook_attacks(square: int, occupied: int):
+    return chess.BB_RANK_ATTACKS[square][chess.BB_RANK_MASKS[square] & occupied] | \
+        chess.BB_FILE_ATTACKS[square][chess.BB_FILE_MASKS[square] & occupied]
+
+
+class Position:
+    """
+    The thinker's own board: twelve piece bitboards, a square to piece table, the side to move, castling rights,
+    en passant square and move counters, with the material balance kept up to date as moves are pushed and popped.
+    Moves are plain ints from encode_move, so searching it allocates nothing per node but the move lists.
+    Only standard chess is supported, castling rights are the KQkq flags.
+    """
+
+    def __init__(self, evaluator=None):
+        """
+        an empty board, use from_fen or from_board to set a position up
+        :param evaluator: MaterialEvaluator whose weights score the position, the default weights when None
+        """
+        evaluator = evaluator if evaluator is not None else MaterialEvaluator()
+        self.values = [evaluator.values[index % 6 + 1] for index in range(12)]  # indexed like pieces
+        self.pieces = [0] * 12
+        self.occupied_co = [0, 0]  # indexed by chess.BLACK and chess.WHITE like chess.Board
+        self.squares = [NO_PIECE] * 64
+        self.turn = chess.WHITE
+        self.castling = 0
+        self.ep_square = NO_SQUARE
+        self.halfmove_clock = 0
+        self.fullmove_number = 1
+        self.material = 0  # from white's point of view
+        self.history = list()
+
+    @classmethod
+    def from_fen(cls, fen: str, evaluator=None):
+        """
+        :param fen: position in Forsyth-Edwards Notation, the move counters may be left out
+        :return: Position
+        """
+        position = cls(evaluator)
+        position.set_fen(fen)
+        return position
+
+    @classmethod
+    def from_board(cls, board: chess.Board, evaluator=None):
+        """
+        copies the position of a chess.Board straight from its bitboards, its move stack is not copied
+        :return: Position
+        """
+        position = cls(evaluator)
+        for color in chess.COLORS:
+            for piece_type in chess.PIECE_TYPES:
+                for square in chess.scan_forward(board.pieces_mask(piece_type, color)):
+                    position.put_piece(square, piece_index(piece_type, color))
+        rights = board.clean_castling_rights()
+        for right, king_square, rook_square in CASTLING_SQUARES:
+            if rights & chess.BB_SQUARES[rook_square]:
+                position.castling |= right
+        position.turn = board.turn
+        position.ep_square = board.ep_square if board.ep_square is not None else NO_SQUARE
+        position.halfmove_clock = board.halfmove_clock
+        position.fullmove_number = board.fullmove_number
+        return position
+
+    def to_board(self):
+        return chess.Board(self.fen())
+
+    def copy(self):
+        position = Position()
+        position.values = self.values
+        position.pieces = list(self.pieces)
+        position.occupied_co = list(self.occupied_co)
+        position.squares = list(self.squares)
+        position.turn = self.turn
+        position.castling = self.castling
+        position.ep_square = self.ep_square
+        position.halfmove_clock = self.halfmove_clock
+        position.fullmove_number = self.fullmove_number
+        position.material = self.material
+        return position
+
+    def clear(self):
+        self.pieces = [0] * 12
+        self.occupied_co = [0, 0]
+        self.squares = [NO_PIECE] * 64
+        self.turn = chess.WHITE
+        self.castling = 0
+        self.ep_square = NO_SQUARE
+        self.halfmove_clock = 0
+        self.fullmove_number = 1
+        self.material = 0
+        self.history = list()
+
+    def set_fen(self, fen: str):
+        fields = fen.split()
+        if len(fields) < 4:
+            raise Exception("Invalid fen: " + fen)
+        self.clear()
+        rows = fields[0].split("/")
+        if len(rows) != 8:
+            raise Exception("Invalid fen: " + fen)
+        for row_number, row in enumerate(rows):
+            rank = 7 - row_number
+            file = 0
+            for char in row:
+                if char.isdigit():
+                    file += int(char)
+                elif char in PIECE_SYMBOLS and file < 8:
+                    self.put_piece(chess.square(file, rank), PIECE_SYMBOLS.index(char))
+                    file += 1
+                else:
+                    raise Exception("Invalid fen: " + fen)
+            if file != 8:
+                raise Exception("Invalid fen: " + fen)
+
+        if fields[1] not in ("w", "b"):
+            raise Exception("Invalid fen: " + fen)
+        self.turn = fields[1] == "w"
+        for right, symbol in CASTLING_SYMBOLS:
+            if symbol in fields[2]:
+                self.castling |= right
+        self.clean_castling()
+        self.ep_square = chess.parse_square(fields[3]) if fields[3] != "-" else NO_SQUARE
+        if len(fields) > 4:
+            self.halfmove_clock = int(fields[4])
+        if len(fields) > 5:
+            self.fullmove_number = int(fields[5])
+
+    def clean_castling(self):
+        """
+        drops the castling rights whose king or rook is not on its starting square, like chess.Board does
+        """
+        for right, king_square, rook_square in CASTLING_SQUARES:
+            color = king_square == chess.E1
+            if self.squares[king_square] != piece_index(chess.KING, color) or \
+                    self.squares[rook_square] != piece_index(chess.ROOK, color):
+                self.castling &= ~right
+
+    def board_fen(self):
+        rows = list()
+        for rank in range(7, -1, -1):
+            row = ""
+            empty = 0
+            for file in range(8):
+                piece = self.squares[chess.square(file, rank)]
+                if piece == NO_PIECE:
+                    empty += 1
+                    continue
+                if empty > 0:
+                    row += str(empty)
+                    empty = 0
+                row += PIECE_SYMBOLS[piece]
+            if empty > 0:
+                row += str(empty)
+            rows.append(row)
+        return "/".join(rows)
+
+    def fen(self):
+        """
+        :return: position in Forsyth-Edwards Notation, the en passant square is only written when the capture is
+        legal, the same as chess.Board.fen
+        """
+        castling = "".join(symbol for right, symbol in CASTLING_SYMBOLS if self.castling & right) or "-"
+        ep_square = "-"
+        if self.ep_square != NO_SQUARE and any(move >> 6 & 63 == self.ep_square and
+                                               self.squares[move & 63] == piece_index(chess.PAWN, self.turn)
+                                               for move in self.legal_moves()):
+            ep_square = chess.SQUARE_NAMES[self.ep_square]
+        return "{} {} {} {} {} {}".format(self.board_fen(), "w" if self.turn else "b", castling, ep_square,
+                                          self.halfmove_clock, self.fullmove_number)
+
+    def put_piece(self, square: int, piece: int):
+        mask = 1 << square
+        self.pieces[piece] |= mask
+        self.occupied_co[piece < 6] |= mask
+        self.squares[square] = piece
+        self.material += self.values[piece] if piece < 6 else -self.values[piece]
+
+    def remove_piece(self, square: int, piece: int):
+        mask = ~(1 << square)
+        self.pieces[piece] &= mask
+        self.occupied_co[piece < 6] &= mask
+        self.squares[square] = NO_PIECE
+        self.material -= self.values[piece] if piece < 6 else -self.values[piece]
+
+    def evaluate(self):
+        """
+        :return: material balance from the point of view of the side to move
+        """
+        return self.material if self.turn else -self.material
+
+    def get_score(self):
+        """
+        :return: material balance from white's point of view, equal to score_chessboard of the same position
+        """
+        return self.material
+
+    def is_attacked(self, square: int, color: bool):
+        """
+        :param square: square to look at
+        :param color: side attacking the square
+        :return: True if a piece of that side attacks the square
+        """
+        base = 0 if color else 6
+        pieces = self.pieces
+        if chess.BB_PAWN_ATTACKS[not color][square] & pieces[base] or \
+                chess.BB_KNIGHT_ATTACKS[square] & pieces[base + 1] or \
+                chess.BB_KING_ATTACKS[square] & pieces[base + 5]:
+            return True
+        occupied = self.occupied_co[0] | self.occupied_co[1]
+        queens = pieces[base + 4]
+        if bishop_attacks(square, occupied) & (pieces[base + 2] | queens):
+            return True
+        return rook_attacks(square, occupied) & (pieces[base + 3] | queens) != 0
+
+    def is_check(self):
+        king = self.pieces[piece_index(chess.KING, self.turn)]
+        return king != 0 and self.is_attacked(king.bit_length() - 1, not self.turn)
+
+    def pseudo_legal_moves(self):
+        """
+        :return: list of the moves of the side to move, some may leave its own king in check
+        """
+        moves = list()
+        us = self.turn
+        base = 0 if us else 6
+        own = self.occupied_co[us]
+        enemy = self.occupied_co[not us]
+        occupied = own | enemy
+        pieces = self.pieces
+
+        pawns = pieces[base]
+        if us:
+            forward = 8
+            single = pawns << 8 & ~occupied & chess.BB_ALL
+            double = (single & chess.BB_RANK_3) << 8 & ~occupied
+            last_rank = chess.BB_RANK_8
+        else:
+            forward = -8
+            single = pawns >> 8 & ~occupied
+            double = (single & chess.BB_RANK_6) >> 8 & ~occupied
+            last_rank = chess.BB_RANK_1
+        targets = enemy
+        if self.ep_square != NO_SQUARE:
+            targets |= 1 << self.ep_square
+        for from_square in chess.scan_forward(pawns):
+            for to_square in chess.scan_forward(chess.BB_PAWN_ATTACKS[us][from_square] & targets):
+                self.add_pawn_move(moves, from_square, to_square, last_rank)
+        for to_square in chess.scan_forward(single):
+            self.add_pawn_move(moves, to_square - forward, to_square, last_rank)
+        for to_square in chess.scan_forward(double):
+            moves.append(to_square - 2 * forward | to_square << 6)
+
+        not_own = ~own
+        for from_square in chess.scan_forward(pieces[base + 1]):
+            for to_square in chess.scan_forward(chess.BB_KNIGHT_ATTACKS[from_square] & not_own):
+                moves.append(from_square | to_square << 6)
+        for from_square in chess.scan_forward(pieces[base + 2] | pieces[base + 4]):
+            for to_square in chess.scan_forward(bishop_attacks(from_square, occupied) & not_own):
+                moves.append(from_square | to_square << 6)
+        for from_square in chess.scan_forward(pieces[base + 3] | pieces[base + 4]):
+            for to_square in chess.scan_forward(rook_attacks(from_square, occupied) & not_own):
+                moves.append(from_square | to_square << 6)
+        for from_square in chess.scan_forward(pieces[base + 5]):
+            for to_square in chess.scan_forward(chess.BB_KING_ATTACKS[from_square] & not_own):
+                moves.append(from_square | to_square << 6)
+
+        if self.castling:
+            self.add_castling_moves(moves, us, occupied)
+        return moves
+
+    @staticmethod
+    def add_pawn_move(moves: list, from_square: int, to_square: int, last_rank: int):
+        if (1 << to_square) & last_rank:
+            for promotion in PROMOTION_TYPES:
+                moves.append(from_square | to_square << 6 | promotion << 12)
+        else:
+            moves.append(from_square | to_square << 6)
+
+    def add_castling_moves(self, moves: list, us: bool, occupied: int):
+        """
+        adds the castling moves whose squares between king and rook are empty and whose king does not start in or
+        pass through check, landing in check is left to legal_moves
+        """
+        them = not us
+        if us:
+            king_side, queen_side, king_square = CASTLE_WHITE_KING, CASTLE_WHITE_QUEEN, chess.E1
+        else:
+            king_side, queen_side, king_square = CASTLE_BLACK_KING, CASTLE_BLACK_QUEEN, chess.E8
+        if not self.castling & (king_side | queen_side) or self.is_attacked(king_square, them):
+            return
+        if self.castling & king_side and not occupied & (0b11 << king_square + 1) and \
+                not self.is_attacked(king_square + 1, them):
+            moves.append(king_square | (king_square + 2) << 6)
+        if self.castling & queen_side and not occupied & (0b111 << king_square - 3) and \
+                not self.is_attacked(king_square - 1, them):
+            moves.append(king_square | (king_square - 2) << 6)
+
+    def legal_moves(self):
+        """
+        :return: list of the legal moves of the side to move as ints, see encode_move
+        """
+        moves = list()
+        us = self.turn
+        king = piece_index(chess.KING, us)
+        king_mask = self.pieces[king]
+        if not king_mask:
+            return self.pseudo_legal_moves()
+        king_square = king_mask.bit_length() - 1
+        # only evasions, king moves, pinned pieces and en passant can leave the king in check, the rest are
+        # legal without being played
+        in_check = self.is_attacked(king_square, not us)
+        risky = king_mask | self.pinned(king_square, us)
+        for move in self.pseudo_legal_moves():
+            if not in_check and not (1 << (move & 63)) & risky and \
+                    (move >> 6 & 63 != self.ep_square or self.squares[move & 63] != king - 5):
+                moves.append(move)
+                continue
+            self.push(move)
+            king_mask = self.pieces[king]
+            if not self.is_attacked(king_mask.bit_length() - 1, not us):
+                moves.append(move)
+            self.pop()
+        return moves
+
+    def pinned(self, king_square: int, color: bool):
+        """
+        :return: bitboard of the pieces of the color that stand alone between their king and an enemy slider
+        """
+        base = 6 if color else 0
+        pieces = self.pieces
+        own = self.occupied_co[color]
+        occupied = own | self.occupied_co[not color]
+        queens = pieces[base + 4]
+        snipers = rook_attacks(king_square, 0) & (pieces[base + 3] | queens) | \
+            bishop_attacks(king_square, 0) & (pieces[base + 2] | queens)
+        pinned = 0
+        for square in chess.scan_forward(snipers):
+            between = chess.between(king_square, square) & occupied
+            if between and not between & (between - 1):
+                pinned |= between & own
+        return pinned
+
+    def push(self, move: int):
+        """
+        applies a move, which has to be pseudo legal
+        :param move: move as an int, see encode_move
+        """
+        from_square = move & 63
+        to_square = move >> 6 & 63
+        promotion = move >> 12
+        us = self.turn
+        piece = self.squares[from_square]
+        captured = self.squares[to_square]
+        self.history.append((move, piece, captured, self.castling, self.ep_square, self.halfmove_clock))
+
+        self.remove_piece(from_square, piece)
+        if captured != NO_PIECE:
+            self.remove_piece(to_square, captured)
+        is_pawn = piece == 0 or piece == 6
+        if is_pawn and to_square == self.ep_square:
+            self.remove_piece(to_square - 8 if us else to_square + 8, 6 if us else 0)
+        self.put_piece(to_square, piece_index(promotion, us) if promotion else piece)
+        if (piece == 5 or piece == 11) and abs(to_square - from_square) == 2:  # castling, move the rook as well
+            rook = piece - 2
+            if to_square > from_square:
+                self.remove_piece(to_square + 1, rook)
+                self.put_piece(to_square - 1, rook)
+            else:
+                self.remove_piece(to_square - 2, rook)
+                self.put_piece(to_square + 1, rook)
+
+        self.castling &= CASTLING_MASKS[from_square] & CASTLING_MASKS[to_square]
+        if is_pawn and abs(to_square - from_square) == 16:
+            self.ep_square = (from_square + to_square) // 2
+        else:
+            self.ep_square = NO_SQUARE
+        if is_pawn or captured != NO_PIECE:
+            self.halfmove_clock = 0
+        else:
+            self.halfmove_clock += 1
+        if not us:
+            self.fullmove_number += 1
+        self.turn = not us
+
+    def pop(self):
+        """
+        takes the last pushed move back
+        :return: the move
+        """
+        move, piece, captured, castling, ep_square, halfmove_clock = self.history.pop()
+        from_square = move & 63
+        to_square = move >> 6 & 63
+        self.turn = us = not self.turn
+        if not us:
+            self.fullmove_number -= 1
+
+        self.remove_piece(to_square, self.squares[to_square])
+        self.put_piece(from_square, piece)
+        if captured != NO_PIECE:
+            self.put_piece(to_square, captured)
+        elif (piece == 0 or piece == 6) and to_square == ep_square:
+            self.put_piece(to_square - 8 if us else to_square + 8, 6 if us else 0)
+        if (piece == 5 or piece == 11) and abs(to_square - from_square) == 2:
+            rook = piece - 2
+            if to_square > from_square:
+                self.remove_piece(to_square - 1, rook)
+                self.put_piece(to_square + 1, rook)
+            else:
+                self.remove_piece(to_square + 1, rook)
+                self.put_piece(to_square - 2, rook)
+
+        self.castling = castling
+        self.ep_square = ep_square
+        self.halfmove_clock = halfmove_clock
+        return move
+
+    def perft(self, depth: int):
+        """
+        counts the leaf nodes of the legal move tree, for checking the move generator against chess.Board
+        :param depth: plies to walk
+        :return: leaf count
+        """
+        if depth == 0:
+            return 1
+        moves = self.legal_moves()
+        if depth == 1:
+            return len(moves)
+        count = 0
+        for move in moves:
+            self.push(move)
+            count += self.perft(depth - 1)
+            self.pop()
+        return count
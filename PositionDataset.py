@@ -0,0 +1,263 @@
+
+##
+# Self-play position datasets
+##
+import math
+import os
+import random
+
+import chess
+import numpy as np
+
+from BatchEvaluator import pack_boards
+from SearchEngine import AlphaBetaSearch
+from Tournament import MAX_PLIES, make_player
+
+
+# one record per position: the piece bitboards laid out like pack_boards, the side to move, the ply, the search
+# score and the final result of the game, both from white's point of view, and the number of the game
+RECORD_DTYPE = np.dtype([
+    ("pieces", "<u8", (8,)),
+    ("turn", "u1"),
+    ("ply", "<u2"),
+    ("score", "<i4"),
+    ("result", "i1"),
+    ("game", "<u4"),
+])
+DEFAULT_SHARD_SIZE = 1 << 18  # records per shard file, 20 MB
+DEFAULT_SCORE_DEPTH = 1
+SHARD_PREFIX = "positions"
+PIECE_VALUE_NAMES = ["p_val", "n_val", "b_val", "r_val", "q_val"]  # keyword arguments of score_chessboard
+DEFAULT_PIECE_VALUES = [100, 350, 350, 550, 1000]  # the defaults of score_chessboard, the fit starts from them
+RESULT_SCALE = 400  # material difference that counts as ten to one odds of winning, as in the elo formula
+
+
+def play_dataset_game(player, opponent, game_num: int, seed: int, score_depth=DEFAULT_SCORE_DEPTH,
+                      max_plies=MAX_PLIES):
+    """
+    plays one game and records every position before a move is made, used as a worker task by
+    BoardManager.generate_dataset. The player has white in odd games and black in even games. Every position is
+    scored by the same fixed depth alpha-beta search whoever plays it. That search scores with the piece values being
+    fitted, so fit_piece_weights fits to the game results and only blends the score in when asked to
+    :param player: spec of one side, see Tournament.make_player
+    :param opponent: spec of the other side
+    :param game_num: number of the game
+    :param seed: seed for the random tie-breaks and random moves of this game
+    :param score_depth: depth of the search scoring every position, 0 scores the material as it stands
+    :param max_plies: plies after which the game is stopped and counted as a draw
+    :return: numpy array of RECORD_DTYPE
+    """
+    random.seed(seed)
+    board = chess.Board()
+    player_color = chess.WHITE if game_num % 2 == 1 else chess.BLACK
+    players = {player_color: make_player(player, board), not player_color: make_player(opponent, board)}
+    boards = list()
+    scores = list()
+    try:
+        while not board.is_game_over() and len(board.move_stack) < max_plies:
+            boards.append(board.copy(stack=False))
+            score = AlphaBetaSearch(board, max_depth=score_depth).search()
+            scores.append(score if board.turn == chess.WHITE else -score)
+            players[board.turn].play()
+    finally:
+        for match_player in players.values():
+            match_player.close()
+
+    outcome = board.outcome()
+    result = 0
+    if outcome is not None and outcome.winner is not None:
+        result = 1 if outcome.winner == chess.WHITE else -1
+    records = np.zeros(len(boards), dtype=RECORD_DTYPE)
+    if len(boards) > 0:
+        records["pieces"] = pack_boards(boards)
+    records["turn"] = [b.turn for b in boards]
+    records["ply"] = np.arange(len(boards))
+    records["score"] = scores
+    records["result"] = result
+    records["game"] = game_num
+    return records
+
+
+def shard_paths(directory: str):
+    """
+    :return: sorted paths of the shard files in a directory
+    """
+    if not os.path.isdir(directory):
+        return list()
+    return [os.path.join(directory, name) for name in sorted(os.listdir(directory))
+            if name.startswith(SHARD_PREFIX + "-") and name.endswith(".npy")]
+
+
+class ShardWriter:
+    """
+    Streams records into fixed size memory mapped .npy shards, a new shard file is started when one is full. The
+    last shard is cut down to the records it holds on close. After a crash it keeps its full size, the loader skips
+    the empty records at its end. New shards are numbered after the ones already in the directory, so several runs
+    can add to the same dataset.
+    """
+
+    def __init__(self, directory: str, shard_size=DEFAULT_SHARD_SIZE):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.shard_size = shard_size
+        self.index = len(shard_paths(directory))
+        self.shard = None
+        self.path = None
+        self.count = 0  # records in the current shard
+        self.records_written = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def open_shard(self):
+        self.path = os.path.join(self.directory, "{}-{:05d}.npy".format(SHARD_PREFIX, self.index))
+        self.shard = np.lib.format.open_memmap(self.path, mode="w+", dtype=RECORD_DTYPE, shape=(self.shard_size,))
+        self.index += 1
+        self.count = 0
+
+    def write(self, records: np.ndarray):
+        """
+        appends records, filling up the current shard before starting the next one
+        :param records: numpy array of RECORD_DTYPE
+        :return:
+        """
+        offset = 0
+        while offset < len(records):
+            if self.shard is None:
+                self.open_shard()
+            size = min(len(records) - offset, self.shard_size - self.count)
+            self.shard[self.count:self.count + size] = records[offset:offset + size]
+            self.count += size
+            offset += size
+            if self.count == self.shard_size:
+                self.shard.flush()
+                self.shard = None
+        self.records_written += len(records)
+
+    def flush(self):
+        if self.shard is not None:
+            self.shard.flush()
+
+    def close(self):
+        if self.shard is None:
+            return
+        filled = np.array(self.shard[:self.count])
+        self.shard.flush()
+        self.shard = None  # the file has to be unmapped before it is rewritten
+        np.save(self.path, filled)
+
+
+class PositionDataset:
+    """
+    Reads the shards of a directory as read only memory maps. Nothing is loaded until a batch is used, and every
+    batch is a slice of a shard, not a copy.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.shards = list()
+        for path in shard_paths(directory):
+            shard = np.load(path, mmap_mode="r")
+            if shard.dtype != RECORD_DTYPE:
+                raise Exception("Invalid shard, unexpected record layout: " + path)
+            used = np.flatnonzero(shard["pieces"][:, 5])  # every real position has kings, crash leftovers do not
+            self.shards.append(shard[:used[-1] + 1 if len(used) > 0 else 0])
+
+    def __len__(self):
+        return sum(len(shard) for shard in self.shards)
+
+    def batches(self, batch_size=65536):
+        """
+        :param batch_size: most records per batch, batches do not cross shards
+        :return: generator of record arrays backed by the shard files
+        """
+        for shard in self.shards:
+            for start in range(0, len(shard), batch_size):
+                yield shard[start:start + batch_size]
+
+
+def piece_counts(records: np.ndarray):
+    """
+    :param records: records of RECORD_DTYPE
+    :return: (n, 6) int64 array of white minus black pawns, knights, bishops, rooks, queens and kings, score_chessboard
+    is this times the piece values
+    """
+    pieces = np.ascontiguousarray(records["pieces"])
+    white = pieces[:, :6] & pieces[:, 6:7]
+    black = pieces[:, :6] & pieces[:, 7:8]
+    n = len(records)
+    white_counts = np.unpackbits(white.view(np.uint8).reshape(n, 6, 8), axis=2).sum(axis=2, dtype=np.int64)
+    black_counts = np.unpackbits(black.view(np.uint8).reshape(n, 6, 8), axis=2).sum(axis=2, dtype=np.int64)
+    return white_counts - black_counts
+
+
+def result_probability(scores: np.ndarray):
+    """
+    :param scores: material scores from white's point of view
+    :return: expected score of white between 0 and 1
+    """
+    return 1 / (1 + 10 ** np.clip(-scores / RESULT_SCALE, -50, 50))
+
+
+def fit_terms(dataset: PositionDataset, weights: np.ndarray, batch_size: int, score_weight: float,
+              prior_curvature: float):
+    """
+    one pass of fit_piece_weights over the dataset
+    :param weights: pawn to queen values to evaluate the fit at
+    :return: (cross entropy loss, gradient, hessian) of the weights, the prior included
+    """
+    prior = np.asarray(DEFAULT_PIECE_VALUES, dtype=np.float64)
+    slope = math.log(10) / RESULT_SCALE  # derivative of the exponent of result_probability
+    loss = prior_curvature * np.sum((weights - prior) ** 2) / 2
+    gradient = prior_curvature * (weights - prior)
+    hessian = prior_curvature * np.eye(5)
+    for batch in dataset.batches(batch_size):
+        features = piece_counts(batch)[:, :5].astype(np.float64)
+        target = (batch["result"].astype(np.float64) + 1) / 2
+        if score_weight > 0:
+            target = (1 - score_weight) * target + score_weight * result_probability(batch["score"])
+        expected = np.clip(result_probability(features @ weights), 1e-12, 1 - 1e-12)
+        loss -= np.sum(target * np.log(expected) + (1 - target) * np.log(1 - expected))
+        gradient += slope * features.T @ (expected - target)
+        hessian += slope ** 2 * (features.T * (expected * (1 - expected))) @ features
+    return loss, gradient, hessian
+
+
+def fit_piece_weights(dataset: PositionDataset, batch_size=65536, score_weight=0.0, prior_weight=10.0,
+                      iterations=20, tolerance=0.1):
+    """
+    logistic (Texel style) fit of the pawn to queen values of score_chessboard to the results of the games, one batch
+    at a time. The material count of every position is turned into an expected result with result_probability and
+    the cross entropy against the actual result is minimized with Newton steps, halved while they make it worse.
+    Kings are always one each and drop out. The search scores were made with the current values, fitting to them
+    alone would only give those back
+    :param dataset: PositionDataset to fit
+    :param batch_size: records per batch
+    :param score_weight: share of the target taken from the search score instead of the game result, 0 to 1
+    :param prior_weight: pulls every value towards DEFAULT_PIECE_VALUES like this many even positions with one extra
+    piece of its type, keeps piece types that are never out of balance in the dataset at their current value
+    :param iterations: most Newton steps, every step reads the dataset at least once
+    :param tolerance: stops once no value moves by more than this
+    :return: dict of score_chessboard keyword arguments to fitted values
+    """
+    if not 0 <= score_weight <= 1:
+        raise Exception("Invalid score weight: " + str(score_weight))
+    prior_curvature = prior_weight * 0.25 * (math.log(10) / RESULT_SCALE) ** 2  # prior_weight even positions
+    weights = np.asarray(DEFAULT_PIECE_VALUES, dtype=np.float64)
+    loss, gradient, hessian = fit_terms(dataset, weights, batch_size, score_weight, prior_curvature)
+    for _ in range(iterations):
+        step = np.linalg.solve(hessian, gradient)
+        while True:
+            new_weights = weights - step
+            new_terms = fit_terms(dataset, new_weights, batch_size, score_weight, prior_curvature)
+            if new_terms[0] <= loss or np.max(np.abs(step)) < tolerance:
+                break
+            step /= 2
+        weights = new_weights
+        loss, gradient, hessian = new_terms
+        if np.max(np.abs(step)) < tolerance:
+            break
+    return {name: round(float(value), 1) for name, value in zip(PIECE_VALUE_NAMES, weights)}
@@ -0,0 +1,70 @@
+
+##
+# Scripted stand-in UCI engine
+##
+import sys
+
+import chess
+
+
+def choose_move(board: chess.Board, options: dict):
+    """
+    picks a move without searching, the first legal move in uci order at full strength and the last one when the
+    strength is limited, so a check can tell from the moves alone which mode the engine is in
+    :param board: position to move in
+    :param options: UCI options set so far
+    :return: uci string of the move, None when there is none
+    """
+    moves = sorted(move.uci() for move in board.legal_moves)
+    if len(moves) == 0:
+        return None
+    return moves[-1] if options.get("UCI_LimitStrength") == "true" else moves[0]
+
+
+def run(lines, output):
+    """
+    answers the UCI commands EnginePool.UCIEngine sends until "quit"
+    :param lines: iterable of command lines
+    :param output: text stream the answers are written to
+    :return:
+    """
+    board = chess.Board()
+    options = dict()
+
+    def reply(text: str):
+        output.write(text + "\n")
+        output.flush()
+
+    for line in lines:
+        words = line.split()
+        if len(words) == 0:
+            continue
+        command = words[0]
+        if command == "uci":
+            reply("id name ScriptedEngine")
+            reply("option name UCI_LimitStrength type check default false")
+            reply("option name UCI_Elo type spin default 1320 min 1320 max 3190")
+            reply("uciok")
+        elif command == "isready":
+            reply("readyok")
+        elif command == "setoption" and "value" in words:
+            split = words.index("value")
+            options[" ".join(words[2:split])] = " ".join(words[split + 1:])
+        elif command == "ucinewgame":
+            board = chess.Board()
+        elif command == "position":
+            moves = words.index("moves") if "moves" in words else len(words)
+            board = chess.Board() if words[1] == "startpos" else chess.Board(" ".join(words[2:moves]))
+            for move in words[moves + 1:]:
+                board.push_uci(move)
+        elif command == "go":
+            info = " ".join("{}={}".format(name, value) for name, value in sorted(options.items()))
+            reply("info string options " + info)
+            move = choose_move(board, options)
+            reply("bestmove " + (move if move is not None else "(none)"))
+        elif command == "quit":
+            break
+
+
+if __name__ == "__main__":
+    run(sys.stdin, sys.stdout)
@@ -0,0 +1,542 @@
+
+##
+# Depth-first search engine
+##
+import random
+import time
+
+import chess
+
+from Evaluator import MaterialEvaluator
+from MoveOrdering import order_captures
+from Position import Position, move_to_uci
+from TranspositionTable import EXACT, LOWER_BOUND, UPPER_BOUND, push_hashed, zobrist_hash
+
+
+INFINITY = 999999
+MAX_ITERATIVE_DEPTH = 64
+TIME_CHECK_INTERVAL = 1024  # nodes searched between looks at the clock
+DELTA_MARGIN = 200  # captures that can not lift the score to within this of alpha are skipped in quiescence
+
+
+class SearchTimeout(Exception):
+    """
+    raised inside a search when its time budget runs out or it is stopped
+    """
+    pass
+
+
+def random_move(moves: list):
+    """
+    generates a random move from the legal possible moves
+    ":param moves: list of valid moves for a given game state
+    :return: move
+    """
+    idx = random.randint(0, len(moves) - 1)
+    return moves[idx]
+
+
+class AlphaBetaSearch:
+    """
+    Negamax search with alpha-beta pruning. Unlike BoardTree, only a single chess.Board is kept and moves are
+    applied with push/pop, so memory grows with the depth of the search and not with the width of the tree.
+    Picks the same moves as the "minimax" scoring style of BoardTree. When a TranspositionTable is given, positions
+    reached through different move orders are only searched once. With quiescence the leaves are not scored
+    straight away, captures are played out until the position is quiet first.
+    """
+
+    def __init__(self, board: chess.Board, max_depth=3, table=None, evaluator=None, deadline=None, pv_moves=None,
+                 orderer=None, stats=None, stop_event=None, quiescence=False, quiescence_checks=False, tablebase=None):
+        """
+        :param deadline: time.time() value after which the search raises SearchTimeout
+        :param pv_moves: principal variation of an earlier search, searched first
+        :param orderer: MoveOrderer sorting the moves of every node, None searches moves in generation order
+        :param stats: optional SearchStats to record node counts and phase timings in
+        :param stop_event: optional threading.Event, the search raises SearchTimeout soon after it is set
+        :param quiescence: True to extend the leaves with a capture only search
+        :param quiescence_checks: True to also search checking moves on the first quiescence ply and every reply
+        when in check
+        :param tablebase: optional EndgameTablebase, positions below the root that it covers are scored from it
+        instead of being searched
+        """
+        self.stats = stats
+        self.board = board.copy()  # search on a private copy so the game board is never touched
+        self.max_depth = max_depth
+        self.table = table
+        self.orderer = orderer
+        self.evaluator = evaluator if evaluator is not None else MaterialEvaluator()
+        self.evaluator.set_board(self.board)
+        self.deadline = deadline
+        self.stop_event = stop_event
+        self.check_time = deadline is not None or stop_event is not None
+        self.quiescence = quiescence
+        self.quiescence_checks = quiescence_checks
+        self.nodes = 0
+        self.qnodes = 0  # nodes searched by the quiescence extension, not included in nodes
+        self.tablebase = tablebase
+        self.tablebase_hits = 0
+
+        self.pv_moves = pv_moves if pv_moves is not None else list()
+        self.follow_pv = False
+        self.pv_lines = [list() for _ in range(max_depth + 2)]  # best line found below each ply
+        self.pv = list()
+        self.best_score = None
+
+    def get_node_count(self):
+        return self.nodes
+
+    def get_qnode_count(self):
+        return self.qnodes
+
+    def get_tablebase_hit_count(self):
+        return self.tablebase_hits
+
+    def out_of_time(self):
+        if self.deadline is not None and time.time() > self.deadline:
+            return True
+        return self.stop_event is not None and self.stop_event.is_set()
+
+    def evaluate(self):
+        """
+        scores the current board from the point of view of the side to move
+        :return: score
+        """
+        score = self.evaluator.get_score()
+        if self.board.turn == chess.WHITE:
+            return score
+        return -score
+
+    def push(self, move: chess.Move, key=None):
+        """
+        applies a move to the search board, keeping the material score and the zobrist hash up to date
+        :param move: move to apply
+        :param key: zobrist hash before the move, only needed with a transposition table
+        :return: zobrist hash after the move
+        """
+        self.evaluator.update(self.board, move)
+        if self.table is not None:
+            return push_hashed(self.board, move, key)
+        self.board.push(move)
+        return None
+
+    def pop(self):
+        self.board.pop()
+        self.evaluator.undo()
+
+    def timed_evaluate(self):
+        """
+        evaluate, adding the time it takes to the stats
+        """
+        start = time.perf_counter()
+        score = self.evaluate()
+        self.stats.evaluate_time += time.perf_counter() - start
+        self.stats.leaves += 1
+        return score
+
+    def start_stats(self):
+        """
+        :return: snapshot taken before a search, for finish_stats
+        """
+        if self.stats is None:
+            return None
+        return time.perf_counter(), self.stats.expand_time, self.stats.evaluate_time
+
+    def finish_stats(self, snapshot):
+        """
+        adds the wall time of a search to the stats, the time not spent expanding or evaluating counts as backing
+        the scores up (pushing, popping and comparing scores)
+        :param snapshot: value returned by start_stats
+        :return:
+        """
+        if self.stats is None:
+            return
+        start, expand_time, evaluate_time = snapshot
+        elapsed = time.perf_counter() - start
+        self.stats.elapsed += elapsed
+        self.stats.searches += 1
+        self.stats.backprop_time += elapsed - (self.stats.expand_time - expand_time) - \
+            (self.stats.evaluate_time - evaluate_time)
+
+    def get_pv(self):
+        """
+        :return: principal variation of the last search as a list of chess.Move
+        """
+        return self.pv
+
+    def order_pv_move(self, moves: list, ply: int):
+        """
+        moves the principal variation move of this ply to the front while the search is still walking down the
+        principal variation of the previous search
+        """
+        if self.follow_pv:
+            if ply < len(self.pv_moves) and self.pv_moves[ply] in moves:
+                moves.remove(self.pv_moves[ply])
+                moves.insert(0, self.pv_moves[ply])
+            else:
+                self.follow_pv = False
+
+    def negamax(self, depth: int, alpha: int, beta: int, key=None, ply=1):
+        """
+        searches the current board to the given depth
+        :param depth: plies left to search
+        :param alpha: lower bound of the search window
+        :param beta: upper bound of the search window
+        :param key: zobrist hash of the current board, only needed with a transposition table
+        :param ply: distance from the root
+        :return: score of the board from the point of view of the side to move
+        """
+        self.nodes += 1
+        if self.check_time and self.nodes % TIME_CHECK_INTERVAL == 0 and self.out_of_time():
+            raise SearchTimeout()
+        stats = self.stats
+        if stats is not None:
+            stats.add_nodes(ply)
+        self.pv_lines[ply] = list()
+        if self.tablebase is not None and ply > 0:
+            score = self.tablebase.score(self.board)
+            if score is not None:  # the exact result, nothing to search below it
+                self.tablebase_hits += 1
+                self.follow_pv = False
+                return score
+        if depth == 0:
+            self.follow_pv = False
+            if self.quiescence:
+                return self.quiesce(alpha, beta, ply, 0)
+            if stats is not None:
+                return self.timed_evaluate()
+            return self.evaluate()
+
+        table = self.table
+        hash_move = None
+        original_alpha = alpha
+        if table is not None:
+            entry = table.probe(key)
+            if entry is not None:
+                hash_move = entry[4]
+                if entry[1] >= depth:
+                    score, bound = entry[2], entry[3]
+                    if bound == EXACT or (bound == LOWER_BOUND and score >= beta) or \
+                            (bound == UPPER_BOUND and score <= alpha):
+                        table.cutoffs += 1
+                        return score
+
+        if stats is not None:
+            expand_start = time.perf_counter()
+        moves = list(self.board.legal_moves)
+        if len(moves) == 0:  # game over, score like any other leaf
+            self.follow_pv = False
+            if stats is not None:
+                stats.expand_time += time.perf_counter() - expand_start
+                return self.timed_evaluate()
+            return self.evaluate()
+        if self.orderer is not None:
+            self.orderer.order(self.board, moves, ply)
+        if hash_move in moves:  # search the best move of an earlier visit first
+            moves.remove(hash_move)
+            moves.insert(0, hash_move)
+        self.order_pv_move(moves, ply)
+        if stats is not None:
+            stats.expand_time += time.perf_counter() - expand_start
+
+        best_score = -INFINITY
+        best_move = None
+        for move_number, move in enumerate(moves):
+            child_key = self.push(move, key)
+            score = -self.negamax(depth - 1, -beta, -alpha, child_key, ply + 1)
+            self.pop()
+            if score > best_score:
+                best_score = score
+                best_move = move
+                if score > alpha:
+                    alpha = score
+                    self.pv_lines[ply] = [move] + self.pv_lines[ply + 1]
+                    if alpha >= beta:  # the opponent will never allow this line
+                        if self.orderer is not None:
+                            self.orderer.record_cutoff(self.board, move, ply, depth, move_number)
+                        break
+
+        if table is not None:
+            if best_score <= original_alpha:
+                bound = UPPER_BOUND
+            elif best_score >= beta:
+                bound = LOWER_BOUND
+            else:
+                bound = EXACT
+            table.store(key, depth, best_score, bound, best_move)
+        return best_score
+
+    def quiesce(self, alpha: int, beta: int, ply: int, qply: int):
+        """
+        searches captures and promotions from a leaf until the position is quiet, so a leaf in the middle of an
+        exchange is not scored with a piece hanging. The side to move may stand pat on the static score instead of
+        capturing, and captures that can not bring the score up to alpha even with DELTA_MARGIN to spare are skipped
+        :param alpha: lower bound of the search window
+        :param beta: upper bound of the search window
+        :param ply: distance from the root
+        :param qply: distance from the leaf the quiescence search started at
+        :return: score of the board from the point of view of the side to move
+        """
+        self.qnodes += 1
+        if self.check_time and self.qnodes % TIME_CHECK_INTERVAL == 0 and self.out_of_time():
+            raise SearchTimeout()
+        stats = self.stats
+        if stats is not None:
+            stats.qnodes += 1
+        board = self.board
+
+        in_check = self.quiescence_checks and board.is_check()
+        if in_check:  # standing pat is not an option, every evasion is searched
+            moves = list(board.legal_moves)
+            if len(moves) == 0:  # game over, score like any other leaf
+                return self.evaluate()
+            best_score = -INFINITY
+        else:
+            stand_pat = self.evaluate()
+            if stand_pat >= beta:
+                return stand_pat
+            if stand_pat > alpha:
+                alpha = stand_pat
+            best_score = stand_pat
+            if self.quiescence_checks and qply == 0:
+                moves = [move for move in board.legal_moves if move.promotion or board.is_capture(move) or
+                         board.gives_check(move)]
+            else:
+                moves = [move for move in board.legal_moves if move.promotion or board.is_capture(move)]
+        order_captures(board, moves)  # without it the capture sequences explode
+
+        for move in moves:
+            if not in_check:
+                gain = self.evaluator.move_delta(board, move)
+                if board.turn == chess.BLACK:
+                    gain = -gain
+                if stand_pat + gain + DELTA_MARGIN <= alpha:
+                    continue
+            self.evaluator.update(board, move)  # the transposition table is not used below the leaves
+            board.push(move)
+            score = -self.quiesce(-beta, -alpha, ply + 1, qply + 1)
+            self.pop()
+            if score > best_score:
+                best_score = score
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        break
+        return best_score
+
+    def search(self, alpha=-INFINITY, beta=INFINITY):
+        """
+        searches the board to max_depth without collecting root moves
+        :param alpha: lower bound of the search window
+        :param beta: upper bound of the search window
+        :return: score of the board from the point of view of the side to move
+        """
+        self.nodes = 0
+        self.qnodes = 0
+        key = zobrist_hash(self.board) if self.table is not None else None
+        snapshot = self.start_stats()
+        try:
+            return self.negamax(self.max_depth, alpha, beta, key, ply=0)
+        finally:
+            self.finish_stats(snapshot)
+
+    def choose_best_scoring_move(self):
+        """
+        searches every root move and collects all of the moves sharing the best score
+        :return: list of the best moves in uci notation
+        """
+        snapshot = self.start_stats()
+        try:
+            return self.search_root()
+        finally:
+            self.finish_stats(snapshot)
+
+    def search_root(self):
+        self.nodes = 1
+        self.qnodes = 0
+        if self.stats is not None:
+            self.stats.add_nodes(0)
+        best_score = -INFINITY
+        possible_best_moves = list()
+        key = zobrist_hash(self.board) if self.table is not None else None
+
+        moves = list(self.board.legal_moves)
+        if self.orderer is not None:
+            self.orderer.order(self.board, moves, 0)
+        self.follow_pv = len(self.pv_moves) > 0
+        self.order_pv_move(moves, 0)
+        for move in moves:
+            child_key = self.push(move, key)
+            # search with the window opened by one below the best score so that ties are scored exactly
+            score = -self.negamax(self.max_depth - 1, -INFINITY, -(best_score - 1), child_key)
+            self.pop()
+            if score > best_score:
+                possible_best_moves.clear()
+                possible_best_moves.append(move.uci())
+                best_score = score
+                self.pv = [move] + self.pv_lines[1]
+            elif score == best_score:
+                possible_best_moves.append(move.uci())
+        self.best_score = best_score
+
+        if self.table is not None and len(possible_best_moves) > 0:
+            self.table.store(key, self.max_depth, best_score, EXACT, chess.Move.from_uci(possible_best_moves[0]))
+        return possible_best_moves
+
+    def figure_move(self):
+        move = random_move(self.choose_best_scoring_move())
+        return move
+
+
+class PositionSearch:
+    """
+    The negamax search of AlphaBetaSearch on a Position instead of a chess.Board. Moves are ints and the material
+    score lives in the position, so no chess.Move or board copies are made below the root. Without a transposition
+    table, move ordering or quiescence it picks the same moves as AlphaBetaSearch does without them.
+    """
+
+    def __init__(self, position: Position, max_depth=3, deadline=None, stop_event=None, stats=None):
+        """
+        :param position: position to search, a copy is searched
+        :param deadline: time.time() value after which the search raises SearchTimeout
+        :param stop_event: optional threading.Event, the search raises SearchTimeout soon after it is set
+        :param stats: optional SearchStats to record the node counts in
+        """
+        self.position = position.copy()
+        self.max_depth = max_depth
+        self.deadline = deadline
+        self.stop_event = stop_event
+        self.check_time = deadline is not None or stop_event is not None
+        self.stats = stats
+        self.nodes = 0
+        self.best_score = None
+
+    def get_node_count(self):
+        return self.nodes
+
+    def out_of_time(self):
+        if self.deadline is not None and time.time() > self.deadline:
+            return True
+        return self.stop_event is not None and self.stop_event.is_set()
+
+    def negamax(self, depth: int, alpha: int, beta: int, ply=1):
+        """
+        :return: score of the position from the point of view of the side to move
+        """
+        self.nodes += 1
+        if self.check_time and self.nodes % TIME_CHECK_INTERVAL == 0 and self.out_of_time():
+            raise SearchTimeout()
+        if self.stats is not None:
+            self.stats.add_nodes(ply)
+        position = self.position
+        if depth == 0:
+            if self.stats is not None:
+                self.stats.leaves += 1
+            return position.evaluate()
+        moves = position.legal_moves()
+        if len(moves) == 0:  # game over, score like any other leaf
+            if self.stats is not None:
+                self.stats.leaves += 1
+            return position.evaluate()
+
+        best_score = -INFINITY
+        for move in moves:
+            position.push(move)
+            score = -self.negamax(depth - 1, -beta, -alpha, ply + 1)
+            position.pop()
+            if score > best_score:
+                best_score = score
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        break
+        return best_score
+
+    def choose_best_scoring_move(self):
+        """
+        searches every root move and collects all of the moves sharing the best score
+        :return: list of the best moves in uci notation
+        """
+        start = time.perf_counter()
+        self.nodes = 1
+        if self.stats is not None:
+            self.stats.add_nodes(0)
+        best_score = -INFINITY
+        possible_best_moves = list()
+        position = self.position
+        try:
+            for move in position.legal_moves():
+                position.push(move)
+                score = -self.negamax(self.max_depth - 1, -INFINITY, -(best_score - 1))
+                position.pop()
+                if score > best_score:
+                    possible_best_moves.clear()
+                    possible_best_moves.append(move_to_uci(move))
+                    best_score = score
+                elif score == best_score:
+                    possible_best_moves.append(move_to_uci(move))
+        finally:
+            if self.stats is not None:
+                self.stats.elapsed += time.perf_counter() - start
+                self.stats.searches += 1
+        self.best_score = best_score
+        return possible_best_moves
+
+    def figure_move(self):
+        move = random_move(self.choose_best_scoring_move())
+        return move
+
+
+class IterativeDeepening:
+    """
+    Runs AlphaBetaSearch at depth 1, 2, 3... until a time budget runs out and keeps the result of the last depth
+    that finished. Each depth searches the principal variation of the one before it first.
+    """
+
+    def __init__(self, board: chess.Board, table=None, max_depth=MAX_ITERATIVE_DEPTH, orderer=None, stats=None,
+                 stop_event=None, quiescence=False, quiescence_checks=False, tablebase=None):
+        self.board = board
+        self.table = table
+        self.max_depth = max_depth
+        self.orderer = orderer
+        self.stats = stats
+        self.stop_event = stop_event
+        self.quiescence = quiescence
+        self.quiescence_checks = quiescence_checks
+        self.tablebase = tablebase
+
+        self.completed_depth = 0
+        self.best_moves = list()
+        self.pv = list()
+        self.nodes = 0
+        self.qnodes = 0
+
+    def search(self, time_ms: int):
+        """
+        :param time_ms: time budget in milliseconds, depth 1 is always finished even when it runs over. None searches
+        until max_depth or until the stop event is set
+        :return: list of the best moves in uci notation from the deepest finished search
+        """
+        deadline = time.time() + time_ms / 1000 if time_ms is not None else None
+        for depth in range(1, self.max_depth + 1):
+            search = AlphaBetaSearch(self.board, max_depth=depth, table=self.table,
+                                     deadline=deadline if depth > 1 else None, pv_moves=self.pv, orderer=self.orderer,
+                                     stats=self.stats, stop_event=self.stop_event, quiescence=self.quiescence,
+                                     quiescence_checks=self.quiescence_checks, tablebase=self.tablebase)
+            try:
+                best_moves = search.choose_best_scoring_move()
+            except SearchTimeout:
+                self.nodes += search.get_node_count()
+                self.qnodes += search.get_qnode_count()
+                break
+            self.nodes += search.get_node_count()
+            self.qnodes += search.get_qnode_count()
+            self.best_moves = best_moves
+            self.pv = search.get_pv()
+            self.completed_depth = depth
+            if deadline is not None and time.time() > deadline:
+                break
+        return self.best_moves
+
+    def figure_move(self, time_ms: int):
+        move = random_move(self.search(time_ms))
+        return move
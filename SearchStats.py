@@ -0,0 +1,87 @@
+
+##
+# Search instrumentation
+##
+
+
+STATS_COLUMNS = ["nodes", "leaves", "qnodes", "nps", "branching factor", "expand time", "evaluate time",
+                 "backprop time"]
+
+
+class SearchStats:
+    """
+    Counters for one search: nodes generated per depth, leaves evaluated, quiescence nodes searched below the leaves
+    and the wall time spent expanding nodes, evaluating leaves and backing scores up. Searches only touch it when
+    they were given one, so leaving it out costs nothing.
+    """
+
+    def __init__(self):
+        self.nodes_per_depth = list()
+        self.leaves = 0
+        self.qnodes = 0
+        self.expand_time = 0.0
+        self.evaluate_time = 0.0
+        self.backprop_time = 0.0
+        self.elapsed = 0.0
+        self.searches = 0
+
+    def add_nodes(self, depth: int, count=1):
+        while len(self.nodes_per_depth) <= depth:
+            self.nodes_per_depth.append(0)
+        self.nodes_per_depth[depth] += count
+
+    def get_nodes(self):
+        return sum(self.nodes_per_depth)
+
+    def get_nps(self):
+        if self.elapsed <= 0:
+            return 0.0
+        return self.get_nodes() / self.elapsed
+
+    def get_branching_factor(self):
+        """
+        effective branching factor, the growth per ply that would give the node count of the deepest layer
+        :return: branching factor
+        """
+        depth = len(self.nodes_per_depth) - 1
+        if depth <= 0 or self.nodes_per_depth[0] == 0:
+            return 0.0
+        return (self.nodes_per_depth[depth] / self.nodes_per_depth[0]) ** (1 / depth)
+
+    def merge(self, other):
+        """
+        adds the counters of another search, used to sum up the moves of a game
+        :param other: SearchStats
+        :return:
+        """
+        for depth, count in enumerate(other.nodes_per_depth):
+            self.add_nodes(depth, count)
+        self.leaves += other.leaves
+        self.qnodes += other.qnodes
+        self.expand_time += other.expand_time
+        self.evaluate_time += other.evaluate_time
+        self.backprop_time += other.backprop_time
+        self.elapsed += other.elapsed
+        self.searches += max(1, other.searches)
+
+    def as_dict(self):
+        return {
+            "nodes_per_depth": list(self.nodes_per_depth),
+            "nodes": self.get_nodes(),
+            "leaves": self.leaves,
+            "qnodes": self.qnodes,
+            "nps": round(self.get_nps(), 1),
+            "branching_factor": round(self.get_branching_factor(), 3),
+            "expand_time": round(self.expand_time, 4),
+            "evaluate_time": round(self.evaluate_time, 4),
+            "backprop_time": round(self.backprop_time, 4),
+            "elapsed": round(self.elapsed, 4),
+        }
+
+    def to_row(self):
+        """
+        :return: values for the STATS_COLUMNS of a bench row
+        """
+        return [self.get_nodes(), self.leaves, self.qnodes, round(self.get_nps(), 1),
+                round(self.get_branching_factor(), 3), round(self.expand_time, 3), round(self.evaluate_time, 3),
+                round(self.backprop_time, 3)]
@@ -0,0 +1,309 @@
+
+##
+# Engine matches with early stopping
+##
+import math
+import os
+import random
+import time
+
+import chess
+
+from BenchWriter import BenchResultWriter
+from ChessThinker import ChessThinker
+from Opponents import FishPlayer, RandomPlayer
+
+
+TOURNAMENT_COLUMNS = ["Game", "Turns to finish", "runtime", "player color", "outcome", "score", "elo", "elo error",
+                      "llr"]
+MAX_PLIES = 300  # games still going after this many plies are adjudicated as draws
+CONFIDENCE_Z = 1.96  # 95% confidence interval of the elo estimate
+MAX_ELO = 1200  # reported instead of an infinite elo after only wins or only losses
+MIN_SPRT_GAMES = 30  # the variance of fewer games is too rough for the test to decide on
+
+
+def make_player(spec, board: chess.Board):
+    """
+    :param spec: dict of ChessThinker.configure keyword arguments for a thinker, or "random", "stockfish" or a dict
+    with an "opponent" key and an optional "elo" for the opponents of BoardManager
+    :param board: board of the game, shared by both players
+    :return: MatchPlayer
+    """
+    if isinstance(spec, str):
+        spec = {"opponent": spec}
+    return MatchPlayer(spec, board)
+
+
+def play_match_game(player, opponent, game_num: int, seed: int, max_plies=MAX_PLIES):
+    """
+    plays one game of a match, used as a worker task by Tournament. The player has white in odd games and black in
+    even games
+    :param player: spec of the player being measured, see make_player
+    :param opponent: spec of its opponent
+    :param game_num: number of the game in the match
+    :param seed: seed for the random tie-breaks and random opponent moves of this game
+    :param max_plies: plies after which the game is scored as a draw
+    :return: (game number, plies, runtime, player color, outcome, score of the player)
+    """
+    random.seed(seed)
+    board = chess.Board()
+    player_color = chess.WHITE if game_num % 2 == 1 else chess.BLACK
+    players = {player_color: make_player(player, board), not player_color: make_player(opponent, board)}
+    start = time.time()
+    try:
+        while not board.is_game_over() and len(board.move_stack) < max_plies:
+            players[board.turn].play()
+    finally:
+        for match_player in players.values():
+            match_player.close()
+    elapsed = round(time.time() - start, 2)
+
+    outcome = board.outcome()
+    if outcome is None:
+        outcome_string = "MAX_PLIES"
+        score = 0.5
+    elif outcome.winner is None:
+        outcome_string = outcome.termination.name
+        score = 0.5
+    elif outcome.winner == player_color:
+        outcome_string = "Player Win"
+        score = 1.0
+    else:
+        outcome_string = "Opponent Win"
+        score = 0.0
+    color = "white" if player_color == chess.WHITE else "black"
+    return game_num, len(board.move_stack), elapsed, color, outcome_string, score
+
+
+def elo_to_score(elo: float):
+    """
+    :return: expected score against an opponent elo points weaker
+    """
+    return 1 / (1 + 10 ** (-elo / 400))
+
+
+def score_to_elo(score: float):
+    """
+    :return: elo difference that gives the expected score, clamped to MAX_ELO
+    """
+    if score <= 0:
+        return -MAX_ELO
+    if score >= 1:
+        return MAX_ELO
+    return max(-MAX_ELO, min(MAX_ELO, -400 * math.log10(1 / score - 1)))
+
+
+def score_variance(wins: int, draws: int, losses: int):
+    """
+    :return: mean score and variance of the score of one game
+    """
+    games = wins + draws + losses
+    score = (wins + draws / 2) / games
+    return score, (wins + draws / 4) / games - score ** 2
+
+
+def elo_estimate(wins: int, draws: int, losses: int):
+    """
+    :return: (elo difference, error) where the error is half the width of the confidence interval
+    """
+    games = wins + draws + losses
+    if games == 0:
+        return 0.0, float(MAX_ELO)
+    score, variance = score_variance(wins, draws, losses)
+    margin = CONFIDENCE_Z * math.sqrt(variance / games)
+    elo = score_to_elo(score)
+    error = (score_to_elo(score + margin) - score_to_elo(score - margin)) / 2
+    return elo, error
+
+
+def sprt_llr(wins: int, draws: int, losses: int, elo0: float, elo1: float):
+    """
+    log likelihood ratio of elo1 against elo0, with the trinomial approximation cutechess-cli uses. Like
+    cutechess-cli it waits for every result to come up at least once, the variance of fewer results is far too small
+    and makes the test decide on a handful of games
+    :return: llr, 0 until there was a win, a draw and a loss
+    """
+    if wins == 0 or draws == 0 or losses == 0:
+        return 0.0
+    games = wins + draws + losses
+    score, variance = score_variance(wins, draws, losses)
+    score0 = elo_to_score(elo0)
+    score1 = elo_to_score(elo1)
+    return (score1 - score0) * (2 * score - score0 - score1) / (2 * variance / games)
+
+
+def sprt_bounds(alpha: float, beta: float):
+    """
+    :param alpha: chance of accepting elo1 when elo0 is true
+    :param beta: chance of accepting elo0 when elo1 is true
+    :return: (lower, upper) llr bounds
+    """
+    return math.log(beta / (1 - alpha)), math.log((1 - beta) / alpha)
+
+
+class MatchPlayer:
+    """
+    One side of a match game, a ChessThinker or one of the opponents of BoardManager
+    """
+
+    def __init__(self, spec: dict, board: chess.Board):
+        self.board = board
+        self.thinker = None
+        self.opponent = None
+        opponent_type = spec.get("opponent")
+        if opponent_type is None:
+            self.thinker = ChessThinker(board)
+            self.thinker.configure(**spec)
+        elif opponent_type.lower() == "random":
+            self.opponent = RandomPlayer(board)
+        elif opponent_type.lower() == "stockfish":
+            self.opponent = FishPlayer(board)
+            if spec.get("elo") is not None:
+                self.opponent.set_elo(spec["elo"])
+        else:
+            raise Exception("Invalid Opponent: " + str(opponent_type))
+
+    def play(self):
+        """
+        plays a move on the shared board
+        :return:
+        """
+        if self.thinker is not None:
+            self.board.push_uci(self.thinker.generate_move())
+        else:
+            self.opponent.figure_move()
+
+    def close(self):
+        if self.thinker is not None:
+            self.thinker.close()
+        elif isinstance(self.opponent, FishPlayer):
+            self.opponent.close()
+
+
+class Tournament:
+    """
+    Plays a match between a player and an opponent in worker processes, alternating colours, and keeps an elo
+    estimate up to date as the games come in. A sequential probability ratio test between elo0 and elo1 stops the
+    match as soon as one of them is accepted, instead of always playing max_games.
+    """
+
+    def __init__(self, player, opponent, workers=None, seed=0, max_plies=MAX_PLIES, elo0=0.0, elo1=10.0, alpha=0.05,
+                 beta=0.05, min_games=MIN_SPRT_GAMES):
+        """
+        :param player: spec of the player being measured, see make_player
+        :param opponent: spec of its opponent, another thinker for thinker-vs-thinker matches
+        :param workers: number of games played at once, None for one per cpu
+        :param seed: base seed, game n is played with seed + n
+        :param max_plies: plies after which a game is scored as a draw
+        :param elo0: elo of the player over the opponent under the null hypothesis
+        :param elo1: elo of the player over the opponent under the alternative hypothesis
+        :param alpha: chance of accepting elo1 when elo0 is true
+        :param beta: chance of accepting elo0 when elo1 is true
+        :param min_games: games before the test may decide
+        """
+        if elo1 <= elo0:
+            raise Exception("Invalid SPRT bounds: elo1 has to be above elo0")
+        self.player = player
+        self.opponent = opponent
+        self.workers = workers
+        self.seed = seed
+        self.max_plies = max_plies
+        self.elo0 = elo0
+        self.elo1 = elo1
+        self.lower_bound, self.upper_bound = sprt_bounds(alpha, beta)
+        self.min_games = min_games
+
+        self.wins = 0
+        self.draws = 0
+        self.losses = 0
+        self.llr = 0.0
+        self.decision = None  # "H0" or "H1" once the test accepts one of them
+
+    def get_games(self):
+        return self.wins + self.draws + self.losses
+
+    def add_result(self, score: float):
+        """
+        counts a finished game and updates the test
+        :param score: 1 for a win of the player, 0.5 for a draw and 0 for a loss
+        :return: True if the test reached a decision
+        """
+        if score == 1:
+            self.wins += 1
+        elif score == 0:
+            self.losses += 1
+        else:
+            self.draws += 1
+        self.llr = sprt_llr(self.wins, self.draws, self.losses, self.elo0, self.elo1)
+        if self.get_games() < self.min_games:
+            return False
+        if self.llr >= self.upper_bound:
+            self.decision = "H1"
+        elif self.llr <= self.lower_bound:
+            self.decision = "H0"
+        return self.decision is not None
+
+    def get_stats(self):
+        """
+        :return: dict with the game counts, the elo estimate and its error, the llr and the decision so far
+        """
+        elo, error = elo_estimate(self.wins, self.draws, self.losses)
+        return {"games": self.get_games(), "wins": self.wins, "draws": self.draws, "losses": self.losses,
+                "elo": round(elo, 1), "elo_error": round(error, 1), "llr": round(self.llr, 3),
+                "lower_bound": round(self.lower_bound, 3), "upper_bound": round(self.upper_bound, 3),
+                "decision": self.decision}
+
+    def run(self, max_games: int, results_path=None, resume=False, verbose=True):
+        """
+        plays games until the test decides or max_games are played, keeping one game per worker in flight. Games
+        still being played when the test decides are not counted
+        :param max_games: most games to play
+        :param results_path: optional csv file every counted game is streamed to together with the estimate after it
+        :param resume: True to count the games already in the results file and only play the missing ones
+        :param verbose: True to print the estimate after every game
+        :return: dict of get_stats
+        """
+        from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+        writer = BenchResultWriter(results_path, TOURNAMENT_COLUMNS, resume=resume) if results_path else None
+        skipped = set()
+        if writer is not None and resume:
+            for row in writer.read_rows():
+                skipped.add(int(row[TOURNAMENT_COLUMNS[0]]))
+                self.add_result(float(row["score"]))
+        pending = (game_num for game_num in range(1, max_games + 1) if game_num not in skipped)
+
+        start = time.time()
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            running = set()
+
+            def submit_next():
+                game_num = next(pending, None) if self.decision is None else None
+                if game_num is not None:
+                    running.add(pool.submit(play_match_game, self.player, self.opponent, game_num,
+                                            self.seed + game_num, self.max_plies))
+
+            for _ in range(self.workers if self.workers is not None else os.cpu_count() or 1):
+                submit_next()
+            while len(running) > 0 and self.decision is None:
+                done, running = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if self.decision is not None:
+                        break
+                    game_num, turns, elapsed, color, outcome, score = future.result()
+                    self.add_result(score)
+                    stats = self.get_stats()
+                    if writer is not None:
+                        writer.write_row([game_num, turns, elapsed, color, outcome, score, stats["elo"],
+                                          stats["elo_error"], stats["llr"]])
+                    if verbose:
+                        print("Game {:<4} {:<14} +{} ={} -{}  elo {:+.1f} +/- {:.1f}  llr {:.2f} ({:.2f}, {:.2f})"
+                              .format(game_num, outcome, self.wins, self.draws, self.losses, stats["elo"],
+                                      stats["elo_error"], self.llr, self.lower_bound, self.upper_bound))
+                    submit_next()
+            # once the test decided no more games are submitted, the pool still lets the games in flight finish
+
+        stats = self.get_stats()
+        if verbose:
+            print("Match finished after", stats["games"], "games in", round(time.time() - start, 2), "seconds,",
+                  "decision:", stats["decision"] if stats["decision"] is not None else "none")
+        return stats
@@ -0,0 +1,171 @@
+
+##
+# Zobrist keyed transposition table
+##
+import chess
+import chess.polyglot
+
+
+EXACT = 0
+LOWER_BOUND = 1
+UPPER_BOUND = 2
+
+ENTRY_SIZE = 160  # rough number of bytes used by one stored entry (tuple + python ints + move)
+
+POLYGLOT_HASHER = chess.polyglot.ZobristHasher(chess.polyglot.POLYGLOT_RANDOM_ARRAY)
+ZOBRIST = chess.polyglot.POLYGLOT_RANDOM_ARRAY
+TURN_KEY = ZOBRIST[780]
+
+
+def zobrist_hash(board: chess.Board):
+    """
+    full 64-bit polyglot zobrist hash of a board
+    :param board: board to hash
+    :return: hash
+    """
+    return chess.polyglot.zobrist_hash(board)
+
+
+def piece_key(piece_type: int, color: bool, square: int):
+    return ZOBRIST[64 * ((piece_type - 1) * 2 + int(color)) + square]
+
+
+def push_hashed(board: chess.Board, move: chess.Move, key: int):
+    """
+    pushes a move onto the board and updates the zobrist hash of the board incrementally
+    :param board: board to apply the move to
+    :param move: move to apply
+    :param key: zobrist hash of the board before the move
+    :return: zobrist hash of the board after the move
+    """
+    color = board.turn
+    piece_type = board.piece_type_at(move.from_square)
+    castling_rights = board.castling_rights
+
+    key ^= TURN_KEY
+    if board.ep_square is not None:
+        key ^= POLYGLOT_HASHER.hash_ep_square(board)
+    key ^= piece_key(piece_type, color, move.from_square)
+
+    if board.is_castling(move):
+        rank = chess.square_rank(move.from_square)
+        if chess.square_file(move.to_square) > chess.square_file(move.from_square):  # king side
+            rook_from, rook_to = chess.square(7, rank), chess.square(5, rank)
+        else:  # queen side
+            rook_from, rook_to = chess.square(0, rank), chess.square(3, rank)
+        key ^= piece_key(chess.ROOK, color, rook_from) ^ piece_key(chess.ROOK, color, rook_to)
+        key ^= piece_key(chess.KING, color, move.to_square)
+    else:
+        captured_type = board.piece_type_at(move.to_square)
+        if captured_type is not None:
+            key ^= piece_key(captured_type, not color, move.to_square)
+        elif piece_type == chess.PAWN and move.to_square == board.ep_square:
+            captured_square = move.to_square - 8 if color == chess.WHITE else move.to_square + 8
+            key ^= piece_key(chess.PAWN, not color, captured_square)
+        key ^= piece_key(move.promotion or piece_type, color, move.to_square)
+
+    if castling_rights:
+        key ^= POLYGLOT_HASHER.hash_castling(board)
+    board.push(move)
+    if castling_rights:
+        key ^= POLYGLOT_HASHER.hash_castling(board)
+    if board.ep_square is not None:
+        key ^= POLYGLOT_HASHER.hash_ep_square(board)
+    return key
+
+
+class TranspositionTable:
+    """
+    Fixed size table of search results keyed by zobrist hash. Every bucket holds two entries, the first one is only
+    replaced by a search of equal or greater depth (or by a newer search), the second one is always replaced.
+    Entries are tuples of (key, depth, score, bound, best move, generation).
+    """
+
+    def __init__(self, size_mb=64):
+        self.bucket_count = max(1, int(size_mb * 1024 * 1024) // (2 * ENTRY_SIZE))
+        self.entries = [None] * (2 * self.bucket_count)
+        self.generation = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.collisions = 0
+        self.cutoffs = 0
+        self.stores = 0
+
+    def __len__(self):
+        return sum(1 for entry in self.entries if entry is not None)
+
+    def clear(self):
+        self.entries = [None] * (2 * self.bucket_count)
+        self.generation = 0
+        self.reset_stats()
+
+    def new_search(self):
+        """
+        ages the stored entries so the depth-preferred slots can be reclaimed by the next search, and resets the
+        counters so they can be read per move
+        :return:
+        """
+        self.generation += 1
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.collisions = 0
+        self.cutoffs = 0
+        self.stores = 0
+
+    def get_stats(self):
+        probes = self.hits + self.misses
+        return {
+            "tt_hits": self.hits,
+            "tt_misses": self.misses,
+            "tt_collisions": self.collisions,
+            "tt_cutoffs": self.cutoffs,
+            "tt_stores": self.stores,
+            "tt_hit_rate": round(self.hits / probes, 4) if probes else 0.0,
+        }
+
+    def get_memory_usage(self):
+        """
+        :return: approximate bytes held by the table when every slot is filled
+        """
+        return 2 * self.bucket_count * ENTRY_SIZE
+
+    def probe(self, key: int):
+        """
+        looks up a position in the table
+        :param key: zobrist hash of the position
+        :return: stored entry tuple or None
+        """
+        idx = 2 * (key % self.bucket_count)
+        for entry in (self.entries[idx], self.entries[idx + 1]):
+            if entry is not None and entry[0] == key:
+                self.hits += 1
+                return entry
+        if self.entries[idx] is not None or self.entries[idx + 1] is not None:
+            self.collisions += 1  # bucket holds other positions
+        self.misses += 1
+        return None
+
+    def store(self, key: int, depth: int, score, bound: int, best_move):
+        """
+        saves a search result
+        :param key: zobrist hash of the position
+        :param depth: plies searched below the position
+        :param score: score from the point of view of the side to move
+        :param bound: EXACT, LOWER_BOUND or UPPER_BOUND
+        :param best_move: best chess.Move found, or None
+        :return:
+        """
+        idx = 2 * (key % self.bucket_count)
+        entry = (key, depth, score, bound, best_move, self.generation)
+        deep = self.entries[idx]
+        self.stores += 1
+        if deep is None or deep[0] == key or depth >= deep[1] or deep[5] != self.generation:
+            if deep is not None and deep[0] != key:
+                self.entries[idx + 1] = deep  # demote the old deep entry to the always-replace slot
+            self.entries[idx] = entry
+        else:
+            self.entries[idx + 1] = entry
@@ -0,0 +1,554 @@
+
+##
+# Search Benchmark
+##
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import chess
+
+from BoardTree import score_chessboard
+from ChessThinker import ChessThinker, SEARCH_STYLES
+from MonteCarloSearch import DEFAULT_PLAYOUTS
+from Position import Position
+
+
+BENCH_POSITIONS = [
+    ("opening-start", "opening", "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"),
+    ("opening-italian", "opening", "r1bqk1nr/pppp1ppp/2n5/2b1p3/2B1P3/5N2/PPPP1PPP/RNBQK2R w KQkq - 4 4"),
+    ("middlegame-qgd", "middlegame", "r1bq1rk1/pp2bppp/2n1pn2/3p4/2PP4/2N1PN2/PP2BPPP/R2QKB1R w KQ - 0 8"),
+    ("middlegame-kiwipete", "middlegame", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1"),
+    ("tactical-scholar", "tactical", "r1bqkb1r/pppp1ppp/2n2n2/4p2Q/2B1P3/8/PPPP1PPP/RNB1K1NR w KQkq - 4 4"),
+    ("tactical-fork", "tactical", "r3k2r/ppp2ppp/2n5/3qp3/8/2N5/PPPP1PPP/R1BQK2R w KQkq - 0 1"),
+    ("endgame-rook", "endgame", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1"),
+    ("endgame-pawn", "endgame", "8/8/4k3/8/2K5/3P4/8/8 w - - 0 1"),
+]
+# extra positions of the perft check, none of the bench positions has promotions or tricky en passant captures
+PERFT_POSITIONS = BENCH_POSITIONS + [
+    ("perft-promotions", "perft", "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1"),
+    ("perft-promotion-captures", "perft", "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8"),
+    ("perft-underpromotions", "perft", "n1n5/PPPk4/8/8/8/8/4Kppp/5N1N b - - 0 1"),
+    ("perft-en-passant-pin", "perft", "8/2p5/3p4/KP5r/1R2Pp1k/8/6P1/8 b - e3 0 1"),
+]
+DEFAULT_DEPTHS = [2, 3]
+DEFAULT_STYLES = ["tree", "compact", "alphabeta", "native"]
+DEFAULT_SEED = 1234
+DEFAULT_TOLERANCE = 0.25
+MIN_COMPARED_TIME = 0.05  # seconds, shorter searches are mostly timer noise
+DEFAULT_PERFT_DEPTH = 3
+# milliseconds a fresh interpreter may take to import the module, python-chess alone takes about 100 of them. Pool
+# workers import these before they can play or search
+IMPORT_BUDGETS = [("BoardTree", 250), ("ChessThinker", 300), ("BoardManager", 350)]
+HEAVY_MODULES = ["pandas", "xlwt", "numpy", "multiprocessing", "EnginePool"]  # loaded on the code paths needing them
+# (piece removed from one side, value the results of the synthetic dataset of run_fit_check give it), the knight is
+# made worth more than now and the bishop is left where it is
+FIT_CHECK_VALUES = [(chess.KNIGHT, 600), (chess.BISHOP, 350)]
+# (win, draw) shares of the equal players of run_sprt_check, a decisive pairing and a drawish one
+SPRT_CHECK_SHARES = [(0.45, 0.10), (0.30, 0.40)]
+SPRT_CHECK_MARGIN = 0.025  # allowed excess of the simulated false accept rate over alpha, 3 standard errors
+
+
+def new_thinker(fen: str, depth: int, search_style: str, scoring_style: str, playouts=DEFAULT_PLAYOUTS):
+    thinker = ChessThinker(chess.Board(fen))
+    thinker.configure(depth=depth, search_style=search_style, scoring_style=scoring_style, playouts=playouts)
+    return thinker
+
+
+def run_position(fen: str, depth: int, search_style: str, scoring_style="minimax", seed=DEFAULT_SEED,
+                 measure_memory=True, playouts=DEFAULT_PLAYOUTS):
+    """
+    searches one position and measures it
+    :param fen: position to search
+    :param depth: search depth
+    :param search_style: see ChessThinker.set_search_style
+    :param scoring_style: "average" or "minimax"
+    :param seed: seed for the random tie-break between equally scored moves
+    :param measure_memory: True to search a second time under tracemalloc for the peak memory
+    :param playouts: playouts per move of the "mcts" style, which ignores the depth
+    :return: dict with the nodes, time, nodes per second, peak memory and chosen move
+    """
+    thinker = new_thinker(fen, depth, search_style, scoring_style, playouts)
+    random.seed(seed)
+    start = time.perf_counter()
+    move = thinker.generate_move()
+    elapsed = time.perf_counter() - start
+    nodes = thinker.get_search_stats().get("nodes", 0)
+    thinker.close()
+
+    peak_memory = None
+    if measure_memory:  # separate run, tracemalloc slows the search down too much to time it at the same time
+        thinker = new_thinker(fen, depth, search_style, scoring_style, playouts)
+        random.seed(seed)
+        tracemalloc.start()
+        thinker.generate_move()
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        thinker.close()
+
+    return {
+        "nodes": nodes,
+        "time": round(elapsed, 4),
+        "nps": round(nodes / elapsed, 1) if elapsed > 0 else 0.0,
+        "peak_memory": peak_memory,
+        "move": move,
+    }
+
+
+def run_suite(depths: list, search_styles: list, scoring_style="minimax", seed=DEFAULT_SEED, measure_memory=True,
+              positions=None, playouts=DEFAULT_PLAYOUTS):
+    """
+    runs every position at every depth with every search style
+    :return: list of result dicts
+    """
+    positions = positions if positions is not None else BENCH_POSITIONS
+    results = list()
+    for search_style in search_styles:
+        for depth in depths:
+            for name, category, fen in positions:
+                result = {"position": name, "category": category, "search_style": search_style, "depth": depth}
+                result.update(run_position(fen, depth, search_style, scoring_style=scoring_style, seed=seed,
+                                           measure_memory=measure_memory, playouts=playouts))
+                print("{:<10} depth {:<2} {:<22} {:>9} nodes {:>8.3f}s {:>10.0f} nps  {}".format(
+                    search_style, depth, name, result["nodes"], result["time"], result["nps"], result["move"]))
+                results.append(result)
+    return results
+
+
+def result_key(result: dict):
+    return result["position"], result["search_style"], result["depth"]
+
+
+def compare_to_baseline(results: list, baseline: list, tolerance=DEFAULT_TOLERANCE):
+    """
+    flags results that got slower, searched more nodes or used more memory than the baseline by more than the
+    tolerance, and results whose chosen move changed
+    :param results: results of this run
+    :param baseline: results of the baseline run
+    :param tolerance: allowed relative increase, 0.25 allows 25% more
+    :return: list of regression messages
+    """
+    baseline_results = {result_key(result): result for result in baseline}
+    regressions = list()
+    for result in results:
+        old = baseline_results.get(result_key(result))
+        if old is None:
+            continue
+        name = "{} {} depth {}".format(*result_key(result))
+        for field in ("time", "nodes", "peak_memory"):
+            if result.get(field) is None or not old.get(field):
+                continue
+            if field == "time" and old[field] < MIN_COMPARED_TIME:
+                continue
+            if result[field] > old[field] * (1 + tolerance):
+                regressions.append("{}: {} went from {} to {}".format(name, field, old[field], result[field]))
+        if result["move"] != old["move"]:
+            regressions.append("{}: move changed from {} to {}".format(name, old["move"], result["move"]))
+    return regressions
+
+
+def legacy_greedy_move(board: chess.Board):
+    """
+    the one ply search as it was before the "greedy" style, resetting the board from a fen after every move
+    """
+    current_fen = board.fen()
+    test_board = chess.Board(fen=current_fen)
+    scores_and_moves = list()
+    for mv in board.legal_moves:
+        move = str(mv)
+        test_board.push_uci(move)
+        scores_and_moves.append((score_chessboard(test_board), move))
+        test_board.set_fen(current_fen)
+    return best_scoring(scores_and_moves)
+
+
+def legacy_greedy_reply_move(board: chess.Board):
+    """
+    the two ply search as it was before the "greedy2" style, resetting the board from a fen after every move
+    """
+    current_fen = board.fen()
+    test_board = chess.Board(fen=current_fen)
+    scores_and_moves = list()
+    for mv in board.legal_moves:
+        move = str(mv)
+        test_board.push_uci(move)
+        reply_fen = test_board.fen()
+        scores = list()
+        for reply in list(test_board.legal_moves):
+            test_board.push_uci(str(reply))
+            scores.append(score_chessboard(test_board))
+            test_board.set_fen(reply_fen)
+        # the old code failed on a move without replies, scored like the new code here
+        scores_and_moves.append((min(scores) if len(scores) > 0 else score_chessboard(test_board), move))
+        test_board.set_fen(current_fen)
+    return best_scoring(scores_and_moves)
+
+
+def best_scoring(scores_and_moves: list):
+    best_score = max(score for score, _ in scores_and_moves)
+    return sorted(move for score, move in scores_and_moves if score == best_score)
+
+
+def run_strategies(repeat=5, positions=None):
+    """
+    times the "greedy" and "greedy2" styles against the fen round tripping code they replaced. The old code scored
+    from white's point of view, so the moves are only compared on positions with white to move
+    :param repeat: searches per position, the fastest one counts
+    :return: list of result dicts with both times and the speedup
+    """
+    positions = positions if positions is not None else BENCH_POSITIONS
+    strategies = [
+        ("greedy", legacy_greedy_move, lambda thinker, moves: thinker.best_apparent_move(moves)),
+        ("greedy2", legacy_greedy_reply_move, lambda thinker, moves: thinker.greedy_reply_move(moves)),
+    ]
+    results = list()
+    for strategy, legacy_search, search in strategies:
+        legacy_time = 0.0
+        new_time = 0.0
+        same_moves = True
+        for name, category, fen in positions:
+            board = chess.Board(fen)
+            thinker = ChessThinker(board)
+            moves = list(board.legal_moves)
+            legacy_best = None
+            legacy_runs = list()
+            new_runs = list()
+            for _ in range(repeat):
+                start = time.perf_counter()
+                legacy_best = legacy_search(board)
+                legacy_runs.append(time.perf_counter() - start)
+                start = time.perf_counter()
+                search(thinker, moves)
+                new_runs.append(time.perf_counter() - start)
+            legacy_time += min(legacy_runs)
+            new_time += min(new_runs)
+            if board.turn == chess.WHITE:
+                random.seed(0)
+                picks = set(search(thinker, moves).uci() for _ in range(200))
+                same_moves = same_moves and picks <= set(legacy_best)
+        result = {
+            "strategy": strategy,
+            "legacy_time": round(legacy_time, 5),
+            "time": round(new_time, 5),
+            "speedup": round(legacy_time / new_time, 2) if new_time > 0 else 0.0,
+            "same_moves": same_moves,
+        }
+        print("{:<10} legacy {:>8.4f}s  push/pop {:>8.4f}s  speedup {:>6.2f}x  same moves {}".format(
+            strategy, result["legacy_time"], result["time"], result["speedup"], same_moves))
+        results.append(result)
+    return results
+
+
+def chess_perft(board: chess.Board, depth: int):
+    """
+    perft with python-chess, the reference for Position.perft
+    """
+    if depth == 0:
+        return 1
+    if depth == 1:
+        return board.legal_moves.count()
+    count = 0
+    for move in board.legal_moves:
+        board.push(move)
+        count += chess_perft(board, depth - 1)
+        board.pop()
+    return count
+
+
+def run_perft(depth=DEFAULT_PERFT_DEPTH, positions=None):
+    """
+    checks the move generator of Position against python-chess and times both of them
+    :param depth: perft depth
+    :param positions: positions to check, defaults to PERFT_POSITIONS
+    :return: list of result dicts, "match" is False where the leaf counts differ
+    """
+    positions = positions if positions is not None else PERFT_POSITIONS
+    results = list()
+    for name, category, fen in positions:
+        board = chess.Board(fen)
+        start = time.perf_counter()
+        expected = chess_perft(board, depth)
+        chess_time = time.perf_counter() - start
+
+        position = Position.from_fen(fen)
+        start = time.perf_counter()
+        nodes = position.perft(depth)
+        elapsed = time.perf_counter() - start
+        result = {
+            "position": name,
+            "depth": depth,
+            "nodes": nodes,
+            "expected": expected,
+            "match": nodes == expected and position.fen() == board.fen(),
+            "time": round(elapsed, 4),
+            "nps": round(nodes / elapsed, 1) if elapsed > 0 else 0.0,
+            "chess_time": round(chess_time, 4),
+            "chess_nps": round(expected / chess_time, 1) if chess_time > 0 else 0.0,
+        }
+        print("perft {:<2} {:<24} {:>9} nodes {:>10.0f} nps  python-chess {:>10.0f} nps  {}".format(
+            depth, name, nodes, result["nps"], result["chess_nps"], "ok" if result["match"] else "MISMATCH"))
+        results.append(result)
+    return results
+
+
+def fit_check_records(game_offset=0):
+    """
+    :return: records of start positions with one piece of a FIT_CHECK_VALUES type taken from one side, 100 games for
+    each side that keeps it, the side with the extra piece winning the share of them its value predicts and losing
+    the rest
+    """
+    from BatchEvaluator import pack_boards
+    from PositionDataset import RECORD_DTYPE, result_probability
+    import numpy as np
+
+    boards = list()
+    results = list()
+    for piece_type, value in FIT_CHECK_VALUES:
+        wins = round(100 * float(result_probability(np.float64(value))))
+        for color in chess.COLORS:
+            board = chess.Board()
+            board.remove_piece_at(next(iter(board.pieces(piece_type, not color))))  # color keeps the extra piece
+            sign = 1 if color == chess.WHITE else -1
+            for game in range(100):
+                boards.append(board)
+                results.append(sign if game < wins else -sign)
+    records = np.zeros(len(boards), dtype=RECORD_DTYPE)
+    records["pieces"] = pack_boards(boards)
+    records["turn"] = chess.WHITE
+    records["result"] = results
+    records["game"] = np.arange(len(boards)) + game_offset
+    return records
+
+
+def run_fit_check():
+    """
+    fits the piece values to a synthetic dataset whose results make a knight worth more than its current value and
+    leave the bishop where it is, to check that the fit follows the game results
+    :return: (result dict, list of failure messages)
+    """
+    from PositionDataset import DEFAULT_PIECE_VALUES, PIECE_VALUE_NAMES, PositionDataset, ShardWriter, \
+        fit_piece_weights
+
+    with tempfile.TemporaryDirectory() as directory:
+        with ShardWriter(directory, shard_size=1000) as writer:
+            writer.write(fit_check_records())
+        fitted = fit_piece_weights(PositionDataset(directory))
+    defaults = dict(zip(PIECE_VALUE_NAMES, DEFAULT_PIECE_VALUES))
+    failures = list()
+    if fitted["n_val"] < defaults["n_val"] + 150:
+        failures.append("knight value {} did not rise from {} towards 600".format(fitted["n_val"], defaults["n_val"]))
+    if abs(fitted["b_val"] - defaults["b_val"]) > 50:
+        failures.append("bishop value {} moved away from {}".format(fitted["b_val"], defaults["b_val"]))
+    print("fit check  fitted {}  {}".format(", ".join("{} {}".format(name, value) for name, value in fitted.items()),
+                                          "ok" if len(failures) == 0 else "FAILED"))
+    return {"fitted": fitted, "ok": len(failures) == 0}, failures
+
+
+def run_engine_check(plies=6):
+    """
+    plays two games against ScriptedEngine from one single engine pool, the first strength limited and the second
+    not, to check that a pooled engine does not keep the strength limit of the player before
+    :param plies: plies of each game
+    :return: (result dict, list of failure messages)
+    """
+    from EnginePool import EnginePool
+    from Opponents import FishPlayer
+    from ScriptedEngine import choose_move
+
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ScriptedEngine.py")
+    failures = list()
+    with EnginePool([sys.executable, script], max_engines=1) as pool:
+        for game, elo in enumerate((1500, None), start=1):
+            board = chess.Board()
+            player = FishPlayer(board, pool=pool)
+            if elo is not None:
+                player.set_elo(elo)
+            limited = {"UCI_LimitStrength": "true" if elo is not None else "false"}
+            try:
+                for _ in range(plies):
+                    expected = choose_move(board, limited)
+                    player.figure_move(timeout=1)
+                    if board.peek().uci() != expected:
+                        failures.append("game {} played {} instead of {}".format(game, board.peek().uci(), expected))
+                        break
+                if player.fish.options.get("UCI_LimitStrength") != limited["UCI_LimitStrength"]:
+                    failures.append("game {} left the engine with options {}".format(game, player.fish.options))
+            finally:
+                player.close()
+        engines = pool.engine_count
+    if engines != 1:
+        failures.append("the games used {} engines instead of sharing one".format(engines))
+    print("engine check  2 games from one pooled engine  {}".format("ok" if len(failures) == 0 else "FAILED"))
+    return {"ok": len(failures) == 0}, failures
+
+
+def run_sprt_check(runs=2000, elo0=0.0, elo1=50.0, alpha=0.05, seed=DEFAULT_SEED):
+    """
+    simulates matches between equally strong players and counts how often the Tournament test accepts elo1, which
+    should happen in at most alpha of them
+    :param runs: simulated matches per pairing
+    :return: (list of result dicts, list of failure messages)
+    """
+    from Tournament import Tournament
+
+    rng = random.Random(seed)
+    results = list()
+    failures = list()
+    for wins, draws in SPRT_CHECK_SHARES:
+        accepted = 0
+        games = 0
+        for _ in range(runs):
+            tournament = Tournament(None, None, elo0=elo0, elo1=elo1, alpha=alpha, beta=alpha)
+            decided = False
+            while not decided and tournament.get_games() < 10000:
+                result = rng.random()
+                decided = tournament.add_result(1.0 if result < wins else 0.5 if result < wins + draws else 0.0)
+            accepted += tournament.decision == "H1"
+            games += tournament.get_games()
+        result = {"wins": wins, "draws": draws, "false_accept_rate": accepted / runs, "games": round(games / runs, 1)}
+        print("sprt check  +{:.0%} ={:.0%} -{:.0%}  false accepts {:.1%} (alpha {:.0%})  {:.0f} games per match".format(
+            wins, draws, wins, result["false_accept_rate"], alpha, result["games"]))
+        if result["false_accept_rate"] > alpha + SPRT_CHECK_MARGIN:
+            failures.append("equal players accepted elo1 in {:.1%} of the matches, alpha is {:.0%}".format(
+                result["false_accept_rate"], alpha))
+        results.append(result)
+    return results, failures
+
+
+def measure_import(module: str, repeat=5):
+    """
+    imports a module in fresh interpreters with -X importtime
+    :param module: module to import
+    :param repeat: interpreters to start, the fastest import counts
+    :return: dict with the import time of the module and of python-chess in milliseconds and the heavy modules it
+    loaded
+    """
+    code = "import sys, {}; print(','.join(name for name in {!r} if name in sys.modules))".format(module, HEAVY_MODULES)
+    import_time = None
+    chess_time = None
+    heavy = list()
+    for _ in range(repeat):
+        process = subprocess.run([sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True,
+                                 cwd=os.path.dirname(os.path.abspath(__file__)), check=True)
+        times = dict()
+        for line in process.stderr.splitlines():
+            fields = line.split("|")
+            if len(fields) == 3 and fields[1].strip().isdigit():
+                times[fields[2].strip()] = int(fields[1]) / 1000
+        if import_time is None or times[module] < import_time:
+            import_time = times[module]
+            chess_time = times.get("chess", 0.0)
+        heavy = [name for name in process.stdout.strip().split(",") if name]
+    return {"module": module, "import_time": round(import_time, 1), "chess_time": round(chess_time, 1),
+            "heavy_modules": heavy}
+
+
+def run_imports(repeat=5):
+    """
+    checks the import time of the core modules against IMPORT_BUDGETS
+    :return: (list of result dicts, list of budget violation messages)
+    """
+    results = list()
+    violations = list()
+    for module, budget in IMPORT_BUDGETS:
+        result = measure_import(module, repeat=repeat)
+        result["budget"] = budget
+        print("import {:<14} {:>7.1f} ms (python-chess {:>6.1f} ms, budget {} ms)  heavy modules: {}".format(
+            module, result["import_time"], result["chess_time"], budget, ", ".join(result["heavy_modules"]) or "none"))
+        if result["import_time"] > budget:
+            violations.append("{} took {} ms to import, budget {} ms".format(module, result["import_time"], budget))
+        if len(result["heavy_modules"]) > 0:
+            violations.append("{} imports {}".format(module, ", ".join(result["heavy_modules"])))
+        results.append(result)
+    return results, violations
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks ChessThinker searches over a fixed set of positions")
+    parser.add_argument("--depths", type=int, nargs="+", default=DEFAULT_DEPTHS)
+    parser.add_argument("--styles", nargs="+", default=DEFAULT_STYLES, choices=SEARCH_STYLES)
+    parser.add_argument("--scoring-style", default="minimax", choices=["average", "minimax"])
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--playouts", type=int, default=DEFAULT_PLAYOUTS, help="playouts per move of the mcts style")
+    parser.add_argument("--no-memory", action="store_true", help="skip the peak memory measurement")
+    parser.add_argument("--output", help="json file to write the results to")
+    parser.add_argument("--baseline", help="json file of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument("--no-strategies", action="store_true",
+                        help="skip timing the greedy styles against the code they replaced")
+    parser.add_argument("--perft-depth", type=int, default=DEFAULT_PERFT_DEPTH,
+                        help="perft depth of the Position move generator check, 0 skips it")
+    parser.add_argument("--no-imports", action="store_true", help="skip checking the import time budgets")
+    parser.add_argument("--no-fit-check", action="store_true",
+                        help="skip checking that the piece value fit follows the game results")
+    parser.add_argument("--no-engine-check", action="store_true",
+                        help="skip checking that pooled engines do not keep the options of earlier players")
+    parser.add_argument("--no-sprt-check", action="store_true",
+                        help="skip simulating the false accept rate of the match test")
+    args = parser.parse_args()
+
+    results = run_suite(args.depths, args.styles, scoring_style=args.scoring_style, seed=args.seed,
+                        measure_memory=not args.no_memory, playouts=args.playouts)
+    strategies = run_strategies() if not args.no_strategies else list()
+    perft = run_perft(args.perft_depth) if args.perft_depth > 0 else list()
+    imports, import_violations = run_imports() if not args.no_imports else (list(), list())
+    fit_check, fit_failures = run_fit_check() if not args.no_fit_check else (None, list())
+    engine_check, engine_failures = run_engine_check() if not args.no_engine_check else (None, list())
+    sprt_check, sprt_failures = run_sprt_check() if not args.no_sprt_check else (list(), list())
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "chess": chess.__version__,
+            "seed": args.seed,
+            "depths": args.depths,
+            "scoring_style": args.scoring_style,
+            "playouts": args.playouts,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": results,
+        "strategies": strategies,
+        "perft": perft,
+        "imports": imports,
+        "fit_check": fit_check,
+        "engine_check": engine_check,
+        "sprt_check": sprt_check,
+    }
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+
+    for violation in import_violations:
+        print("IMPORT BUDGET:", violation)
+    mismatches = [result["position"] for result in perft if not result["match"]]
+    if len(mismatches) > 0:
+        print("PERFT MISMATCH:", ", ".join(mismatches))
+    for failure in fit_failures:
+        print("FIT CHECK:", failure)
+    for failure in engine_failures:
+        print("ENGINE CHECK:", failure)
+    for failure in sprt_failures:
+        print("SPRT CHECK:", failure)
+    failures = fit_failures + engine_failures + sprt_failures
+    if len(mismatches) > 0 or len(import_violations) > 0 or len(failures) > 0:
+        sys.exit(1)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        regressions = compare_to_baseline(results, baseline["results"], tolerance=args.tolerance)
+        for regression in regressions:
+            print("REGRESSION:", regression)
+        if len(regressions) > 0:
+            sys.exit(1)
+        print("No regressions against", args.baseline)
+
+
+if __name__ == "__main__":
+    main()